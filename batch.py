@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+from typing import List
+
+import numpy as np
+from scipy.sparse import linalg as sparse_linalg
+
+from world import World, Item, ItemAmount, Recipe
+from error_handler import MyCustomError
+from graph import ProductionGraph
+from solver import RecipeMatrix, LinearSolver, TOLERANCE
+
+
+class BatchResult:
+    """ Plans for many target vectors. Row t of machines holds the machines
+    per recipe (columns follow recipes) for target vector t, and row t of raw
+    the raw consumption per minute (columns follow raw_items).
+    """
+
+    def __init__(self, recipes: List[Recipe], raw_items: List[Item],
+                 machines: np.ndarray, raw: np.ndarray) -> None:
+        self.recipes = recipes
+        self.raw_items = raw_items
+        self.machines = machines
+        self.raw = raw
+
+
+class BatchPlanner:
+    """ Plans target vectors in bulk from a unit table computed once.
+
+    Every item with a selected recipe (its default recipe unless selection
+    overrides it by item classname) gets one equation, except items sharing
+    their recipe with another (see LinearSolver.assign_equations), and the
+    system is inverted once. unit_machines[:, i] is then the machines per
+    recipe for one item i per minute and unit_raw[:, i] its raw consumption,
+    so a batch of targets is answered by two matrix products.
+    """
+
+    def __init__(self, world: World, selection: dict=None,
+                 matrix: RecipeMatrix=None) -> None:
+        self.world = world
+        self.matrix = matrix if matrix is not None else RecipeMatrix(world)
+        selection = selection if selection is not None else {}
+        LinearSolver(world, self.matrix).check_selection(selection)
+        items = self.matrix.items
+
+        pairs = []
+        for item in items:
+            recipe = ProductionGraph.recipe_for(item, selection)
+            if recipe is not None:
+                pairs.append((item, recipe))
+        row_items, self.recipes, shared = LinearSolver.assign_equations(pairs)
+        produced_rows = [self.matrix.item_ids[x.classname] for x in row_items]
+        produced_set = set(produced_rows)
+        raw_rows = [row for row in range(len(items))
+                    if row not in produced_set]
+        # includes items whose recipe belongs to another item; a negative
+        # consumption of them is surplus
+        self.raw_items = [items[row] for row in raw_rows]
+
+        cols = [self.matrix.recipe_ids[x.classname] for x in self.recipes]
+        system = self.matrix.matrix[:, cols]
+        try:
+            factor = sparse_linalg.splu(system[produced_rows, :].tocsc())
+        except RuntimeError:
+            raise MyCustomError('The selected recipes form a singular '
+                                'system.')
+        # machines per recipe for one unit of each produced item
+        inverse = factor.solve(np.eye(len(produced_rows)))
+        self.unit_machines = np.zeros((len(self.recipes), len(items)))
+        self.unit_machines[:, produced_rows] = inverse
+        consumption = -(system[raw_rows, :] @ self.unit_machines)
+        consumption[np.arange(len(raw_rows)), raw_rows] += 1
+        self.unit_raw = consumption
+        self.infeasible_items = [
+            items[i] for i in np.flatnonzero(
+                (self.unit_machines < -TOLERANCE).any(axis=0))]
+
+    def target_array(self, targets: List[List[ItemAmount]]) -> np.ndarray:
+        """ Converts lists of ItemAmount into an (n, items) rate array whose
+        columns follow world.items.
+        """
+        array = np.zeros((len(targets), len(self.matrix.items)))
+        for row, item_amounts in enumerate(targets):
+            for item_amount in item_amounts:
+                column = self.matrix.item_ids[item_amount.item.classname]
+                array[row, column] += float(item_amount.amount)
+        return array
+
+    def plan(self, targets, chunk_size: int=4096) -> BatchResult:
+        """ Plans an (n, items) array of rates per minute, or a list of
+        ItemAmount lists, in chunks of chunk_size target vectors.
+        """
+        if not isinstance(targets, np.ndarray):
+            targets = self.target_array(targets)
+        if targets.ndim != 2 or targets.shape[1] != len(self.matrix.items):
+            raise MyCustomError(
+                f'Targets must have shape (n, {len(self.matrix.items)}).')
+        count = targets.shape[0]
+        machines = np.empty((count, len(self.recipes)))
+        raw = np.empty((count, len(self.raw_items)))
+        for start in range(0, count, chunk_size):
+            chunk = targets[start:start + chunk_size]
+            machines[start:start + chunk_size] = chunk @ self.unit_machines.T
+            raw[start:start + chunk_size] = chunk @ self.unit_raw.T
+        return BatchResult(self.recipes, self.raw_items, machines, raw)
@@ -0,0 +1,76 @@
+""" Guards the import time of the planning API.
+
+Imports each core module in a fresh interpreter, reports the best wall time
+over a few runs and the slowest imports seen by -X importtime, and exits with
+status 1 when a module is over budget or pulls in a visualization package.
+
+Run from the repository root:
+    python -m benchmarks.bench_import [--budget-ms 60]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CORE_MODULES = ['world', 'designer', 'graph', 'incremental']
+FORBIDDEN = ['diagrams', 'graphviz']
+RUNS = 5
+
+
+def import_time(module: str) -> float:
+    """ Best wall time in ms of importing module, minus a bare start. """
+    def best(code):
+        times = []
+        for _ in range(RUNS):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, '-c', code], cwd=ROOT,
+                           check=True)
+            times.append(time.perf_counter() - start)
+        return min(times)
+    return (best(f'import {module}') - best('pass'))*1000
+
+
+def loaded_modules(module: str) -> set:
+    code = f'import sys, {module}; print(" ".join(sys.modules))'
+    output = subprocess.run([sys.executable, '-c', code], cwd=ROOT,
+                            check=True, capture_output=True, text=True)
+    return set(output.stdout.split())
+
+
+def slowest_imports(module: str, count: int=5) -> list:
+    output = subprocess.run([sys.executable, '-X', 'importtime', '-c',
+                             f'import {module}'], cwd=ROOT, check=True,
+                            capture_output=True, text=True)
+    rows = []
+    # lines look like "import time:   self [us] | cumulative | name"
+    for line in output.stderr.splitlines()[1:]:
+        _, cumulative, name = line.split(':', 1)[1].split('|')
+        rows.append((int(cumulative), name.strip()))
+    return sorted(rows, reverse=True)[:count]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--budget-ms', type=float, default=60)
+    args = parser.parse_args()
+    failed = False
+    for module in CORE_MODULES:
+        elapsed = import_time(module)
+        forbidden = [x for x in FORBIDDEN if x in loaded_modules(module)]
+        status = 'ok'
+        if elapsed > args.budget_ms:
+            status = 'OVER BUDGET'
+            failed = True
+        if forbidden:
+            status = 'imports ' + ', '.join(forbidden)
+            failed = True
+        print(f'{module:<12} {elapsed:8.1f} ms  {status}')
+        for cumulative, name in slowest_imports(module, 3):
+            print(f'    {cumulative/1000:8.1f} ms  {name}')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
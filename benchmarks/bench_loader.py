@@ -0,0 +1,127 @@
+""" Compares the full JSON load with the streaming loader.
+
+Each load runs under tracemalloc in a fresh interpreter, so the peak covers
+only that load, and reports wall time, traced peak memory and the memory
+still held by the built World.
+
+First, the streaming loader is checked against Startup.build_world at small
+and odd chunk sizes, on the dataset and on a copy with scalar members
+between its sections, where entries and numbers get cut off at every
+possible point. The exit status is 1 when a world differs.
+
+Run from the repository root:
+    python -m benchmarks.bench_loader [--data path/to/data.json]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CHECK_CHUNK_SIZES = (1, 2, 3, 5, 7, 13, 64, 1000, 4099)
+
+LOADS = {
+    'json.load + instantiate': 'Startup.build_world("bench", path)',
+    'streaming, all sections':
+        'stream_loader.load_world("bench", path, keep_descriptions=True)',
+    'streaming, no descriptions': 'stream_loader.load_world("bench", path)',
+    'streaming, items + recipes':
+        'stream_loader.load_world("bench", path, '
+        'sections=("items", "recipes"))',
+    }
+
+MEASURE = '''
+import json, sys, time, tracemalloc
+import stream_loader
+from world import Startup
+path = sys.argv[1]
+tracemalloc.start()
+start = time.perf_counter()
+world = {load}
+elapsed = time.perf_counter() - start
+current, peak = tracemalloc.get_traced_memory()
+print(json.dumps({{'seconds': elapsed, 'peak': peak, 'retained': current}}))
+'''
+
+
+def measure(load: str, path: str) -> dict:
+    output = subprocess.run(
+        [sys.executable, '-c', MEASURE.format(load=load), path], cwd=ROOT,
+        check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def with_scalars(path: str) -> str:
+    """ Copy of the dataset with number, literal and array members before,
+    between and after its sections.
+    """
+    with open(path, encoding='utf-8') as data_file:
+        data = json.load(data_file)
+    padded = {'version': 1234567890, 'ratio': -1.5e-10, 'beta': True}
+    for section, entries in data.items():
+        padded[section] = entries
+        padded[section + '_count'] = len(entries)
+    padded.update({'patch': None, 'tags': [1, 2.5, 'x'], 'build': 987654321})
+    handle, copy_path = tempfile.mkstemp(suffix='.json')
+    with os.fdopen(handle, 'w', encoding='utf-8') as copy_file:
+        json.dump(padded, copy_file)
+    return copy_path
+
+
+def check_chunk_sizes(path: str) -> list:
+    """ (file, chunk size) pairs where streaming fails or the streamed
+    world differs from the one Startup.build_world makes.
+    """
+    sys.path.insert(0, ROOT)
+    import snapshot
+    import stream_loader
+    from error_handler import MyCustomError
+    from world import Startup
+
+    expected = snapshot.encode(Startup.build_world('check', path))
+    failures = []
+    copy_path = with_scalars(path)
+    try:
+        for label, checked in (('dataset', path), ('with scalars', copy_path)):
+            for size in CHECK_CHUNK_SIZES:
+                try:
+                    world = stream_loader.load_world(
+                        'check', checked, keep_descriptions=True,
+                        chunk_size=size)
+                except MyCustomError:
+                    world = None
+                if world is None or snapshot.encode(world) != expected:
+                    failures.append((label, size))
+    finally:
+        os.remove(copy_path)
+    return failures
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--data', default=os.path.join(ROOT, 'source',
+                                                       'data.json'))
+    arguments = parser.parse_args()
+    failures = check_chunk_sizes(arguments.data)
+    for label, size in failures:
+        print(f'MISMATCH streaming {label} with chunk_size={size}')
+    if failures:
+        return 1
+    print('streamed worlds match build_world at chunk sizes '
+          + ', '.join(str(x) for x in CHECK_CHUNK_SIZES))
+    size = os.path.getsize(arguments.data)
+    print(f'{arguments.data}: {size/2**20:.2f} MiB')
+    print(f'{"load":<30} {"time ms":>10} {"peak MiB":>10} '
+          f'{"retained MiB":>13}')
+    for label, load in LOADS.items():
+        result = measure(load, arguments.data)
+        print(f'{label:<30} {result["seconds"]*1e3:>10.1f} '
+              f'{result["peak"]/2**20:>10.2f} '
+              f'{result["retained"]/2**20:>13.2f}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
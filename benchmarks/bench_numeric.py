@@ -0,0 +1,58 @@
+""" Compares the exact and float ratio paths.
+
+Run from the repository root:
+    python -m benchmarks.bench_numeric
+"""
+import math
+import timeit
+from decimal import Decimal
+
+import numpy as np
+
+import numeric
+from designer import TreeBuilder
+from world import Startup, ItemAmount
+
+REPEATS = 5
+
+
+def decimal_lcm(numbers):
+    """ The former CalcUtils approach: scale through Decimal strings. """
+    places = max(abs(Decimal(str(x)).normalize().as_tuple().exponent)
+                 for x in numbers)
+    integers = [int(Decimal(str(x))*10**places) for x in numbers]
+    return math.lcm(*integers)//10**places
+
+
+def best(statement, number):
+    return min(timeit.repeat(statement, number=number, repeat=REPEATS))/number
+
+
+def main():
+    world = Startup.setup_world('benchmark')
+    amounts = [x.amount for recipe in world.recipes
+               for x in recipe.ingredients + recipe.products]
+    array = np.array(amounts, dtype=np.float64)
+    rows = [
+        ('lcm, Decimal strings', lambda: decimal_lcm(amounts[:64]), 200),
+        ('lcm, exact Fractions', lambda: numeric.lcm(amounts[:64]), 200),
+        ('lcm, NumPy floats', lambda: numeric.float_lcm(array[:64]), 200),
+        ('integer ratio, exact', lambda: numeric.integer_ratio(amounts), 20),
+        ('integer ratio, NumPy',
+         lambda: numeric.float_integer_ratio(array), 20),
+        ]
+    targets = [ItemAmount(item, 7) for item in world.items
+               if item.default_recipe is not None]
+    for exact in (False, True):
+        def expand(exact=exact):
+            TreeBuilder.unit_cost_cache.clear()
+            TreeBuilder.disassemble_to_raw(targets, exact=exact)
+        label = 'exact' if exact else 'float'
+        rows.append((f'unit costs of every item, {label}', expand, 5))
+
+    for label, statement, number in rows:
+        print(f'{label:<40} {best(statement, number)*1e6:>12.1f} us')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,181 @@
+""" Benchmark suite over the bundled dataset.
+
+Every workload is timed with timeit (best and median of REPEATS runs, the
+garbage collector off as timeit does) and then run once more under
+tracemalloc to get the peak traced memory and the number of memory blocks
+it still holds (net allocations). Results can be saved as a baseline and
+later runs compared against it: a workload whose best time or peak memory
+grew by more than the threshold is flagged and the exit status is 1.
+
+Run from the repository root:
+    python -m benchmarks.suite                         # print results
+    python -m benchmarks.suite --save benchmarks/baseline.json
+    python -m benchmarks.suite --compare benchmarks/baseline.json
+    python -m benchmarks.suite --only tree --threshold 0.2
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import statistics
+import sys
+import timeit
+import tracemalloc
+
+import satisfactory_parser as sp
+import snapshot
+from designer import TreeBuilder
+from render import GraphRenderer
+from world import Startup, ObjectInstantiator, Binder, ItemAmount
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA = os.path.join(ROOT, 'source', 'data.json')
+AMOUNTS = (1, 7, 60)
+REPEATS = 5
+THRESHOLD = 0.10
+
+
+def craftable_items(world):
+    """ Items disassemble_to_root_building accepts, in dataset order. """
+    return [item for item in world.items
+            if item.default_recipe is not None
+            and item.default_recipe.buildings]
+
+
+def workloads():
+    """ (name, callable, calls per timing) in a fixed order. """
+    world = Startup.setup_world('benchmark', DATA)
+    dataset = sp.load_dataset(DATA)
+    items = ObjectInstantiator.instantiate_items(dataset['items'])
+    buildings = ObjectInstantiator.instantiate_buildings(
+        dataset['buildings'])
+    drafts = ObjectInstantiator.instantiate_draft_recipes(dataset['recipes'])
+    recipes = Binder.bind_recipes(items, buildings, drafts)
+    builder = TreeBuilder()
+    targets = [[ItemAmount(item, amount)] for amount in AMOUNTS
+               for item in craftable_items(world)]
+    trees = [builder.disassemble_to_root_building(x) for x in targets]
+
+    def setup_from_json():
+        sp.invalidate(DATA)
+        Startup.setup_world('benchmark', DATA, use_snapshot=False)
+
+    def setup_from_snapshot():
+        snapshot.load_if_fresh('benchmark', DATA)
+
+    def bind_default_recipes():
+        Binder.bind_default_recipes(items, recipes)
+
+    def disassemble_every_item():
+        for item_amounts in targets:
+            builder.disassemble_to_root_building(item_amounts)
+
+    def node_lists():
+        for tree in trees:
+            builder.tree_to_node_list(tree)
+
+    def dot_generation():
+        for tree in trees:
+            GraphRenderer.from_tree(tree).to_dot()
+
+    return [
+        ('setup_world, from JSON', setup_from_json, 5),
+        ('setup_world, from snapshot', setup_from_snapshot, 20),
+        ('Binder.bind_recipes',
+         lambda: Binder.bind_recipes(items, buildings, drafts), 20),
+        ('Binder.bind_default_recipes', bind_default_recipes, 50),
+        (f'tree: disassemble_to_root_building x{len(targets)}',
+         disassemble_every_item, 2),
+        (f'tree: tree_to_node_list x{len(trees)}', node_lists, 5),
+        (f'render: DOT x{len(trees)}', dot_generation, 2),
+        ]
+
+
+def measure(statement, number: int) -> dict:
+    times = [x/number for x in
+             timeit.repeat(statement, number=number, repeat=REPEATS)]
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    tracemalloc.reset_peak()
+    start_size = tracemalloc.get_traced_memory()[0]
+    statement()
+    peak = tracemalloc.get_traced_memory()[1] - start_size
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    blocks = sum(x.count_diff for x in after.compare_to(before, 'filename'))
+    return {'best_ms': min(times)*1e3,
+            'median_ms': statistics.median(times)*1e3,
+            'peak_kib': peak/1024, 'net_blocks': blocks}
+
+
+def environment() -> dict:
+    stat = os.stat(DATA)
+    return {'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'machine': platform.machine(), 'system': platform.system(),
+            'dataset_size': stat.st_size}
+
+
+def regressions(results: dict, baseline: dict, threshold: float) -> list:
+    """ (workload, metric, baseline, current) over threshold. """
+    flagged = []
+    for name, result in results.items():
+        old = baseline['results'].get(name)
+        if old is None:
+            continue
+        for metric in ('best_ms', 'peak_kib'):
+            if (old[metric] > 0
+                    and result[metric] > old[metric]*(1 + threshold)):
+                flagged.append((name, metric, old[metric], result[metric]))
+    return flagged
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--save', metavar='PATH',
+                        help='write the results as a baseline')
+    parser.add_argument('--compare', metavar='PATH',
+                        help='flag regressions against a baseline')
+    parser.add_argument('--threshold', type=float, default=THRESHOLD,
+                        help='allowed relative growth (default 0.10)')
+    parser.add_argument('--only', default='',
+                        help='run workloads whose name contains this')
+    args = parser.parse_args()
+
+    results = {}
+    print(f'{"workload":<46} {"best ms":>9} {"median ms":>10} '
+          f'{"peak KiB":>9} {"net blocks":>11}')
+    for name, statement, number in workloads():
+        if args.only not in name:
+            continue
+        result = measure(statement, number)
+        results[name] = result
+        print(f'{name:<46} {result["best_ms"]:>9.2f} '
+              f'{result["median_ms"]:>10.2f} {result["peak_kib"]:>9.1f} '
+              f'{result["net_blocks"]:>11}')
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as baseline_file:
+            json.dump({'environment': environment(), 'results': results},
+                      baseline_file, indent=2)
+        print(f'baseline saved to {args.save}')
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as baseline_file:
+            baseline = json.load(baseline_file)
+        if baseline.get('environment') != environment():
+            print('warning: the baseline was recorded in another '
+                  'environment', file=sys.stderr)
+        flagged = regressions(results, baseline, args.threshold)
+        for name, metric, old, new in flagged:
+            print(f'REGRESSION {name}: {metric} {old:.2f} -> {new:.2f} '
+                  f'(+{(new/old - 1)*100:.0f}%)')
+        if flagged:
+            return 1
+        print(f'no regressions over {args.threshold:.0%}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
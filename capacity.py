@@ -0,0 +1,204 @@
+""" Supply side of a plan: miners for the raw demand and generators for the
+power draw.
+
+A miner extracts items_per_cycle every extract_cycle_time seconds on a
+normal node; impure nodes give half of that and pure nodes twice as much.
+A generator burns power_production/energy_value fuel items per second, and
+liquid fuels and water are counted in m3 like in recipes.
+"""
+from __future__ import annotations
+
+from typing import Dict, List
+
+import numpy as np
+
+from world import World, Item, Generator, Fuel
+from error_handler import MyCustomError
+from graph import ProductionGraph
+
+PURITIES = ('impure', 'normal', 'pure')
+PURITY_MULTIPLIERS = np.array([0.5, 1.0, 2.0])
+# dataset liquid amounts are in liters, recipes use m3
+LITERS_PER_M3 = 1000
+
+
+class ExtractionPlan:
+    """ Miners needed for every demanded item, on every node purity.
+
+    counts[i, m, p]: fractional number of miners[m] on purity p nodes
+    extracting items[i]; nan where the miner cannot extract the item.
+    whole[i, m, p]: counts rounded up, -1 where the miner cannot extract it.
+    """
+
+    def __init__(self, items: List[Item], demand: np.ndarray,
+                 miners: list, counts: np.ndarray) -> None:
+        self.items = items
+        self.demand = demand
+        self.miners = miners
+        self.counts = counts
+        self.whole = np.where(np.isnan(counts), -1,
+                              np.ceil(np.nan_to_num(counts) - 1e-9)
+                              ).astype(np.int64)
+
+    def unsupported(self) -> List[Item]:
+        """ Demanded items no miner can extract (e.g. water). """
+        mask = np.isnan(self.counts).all(axis=(1, 2))
+        return [item for item, missing in zip(self.items, mask) if missing]
+
+    def rows(self) -> List[tuple]:
+        """ (item, demand, miner, purity, miners, whole miners) for every
+        miner able to extract a demanded item.
+        """
+        rows = []
+        for i, m, p in zip(*np.nonzero(~np.isnan(self.counts))):
+            rows.append((self.items[i], float(self.demand[i]),
+                         self.miners[m], PURITIES[p],
+                         float(self.counts[i, m, p]),
+                         int(self.whole[i, m, p])))
+        return rows
+
+
+class PowerPlan:
+    """ Every (generator, fuel) option for a power draw in MW.
+
+    generators: fractional generators at 100% clock.
+    whole_generators: generators rounded up.
+    fuel: fuel items (or m3) per minute.
+    water: m3 of water per minute.
+    byproduct: byproduct items per minute.
+    """
+
+    def __init__(self, power: float, options: List[tuple],
+                 generators: np.ndarray, fuel: np.ndarray, water: np.ndarray,
+                 byproduct: np.ndarray) -> None:
+        self.power = power
+        self.options = options
+        self.generators = generators
+        self.whole_generators = np.ceil(generators - 1e-9).astype(np.int64)
+        self.fuel = fuel
+        self.water = water
+        self.byproduct = byproduct
+
+    def option(self, fuel_item: Item) -> int:
+        for index, (generator, fuel) in enumerate(self.options):
+            if fuel.item.classname == fuel_item.classname:
+                return index
+        raise MyCustomError(f'No generator burns {fuel_item.name}.')
+
+    def consumption(self, fuel_item: Item) -> Dict[Item, float]:
+        """ Items per minute burned when all power comes from fuel_item. """
+        index = self.option(fuel_item)
+        generator, fuel = self.options[index]
+        consumption = {fuel.item: float(self.fuel[index])}
+        if fuel.supplemental_item is not None and self.water[index]:
+            consumption[fuel.supplemental_item] = float(self.water[index])
+        return consumption
+
+    def rows(self) -> List[tuple]:
+        """ (generator, fuel, generators, whole generators, fuel/min,
+        water/min, byproduct/min) per option.
+        """
+        return [(generator, fuel, float(self.generators[i]),
+                 int(self.whole_generators[i]), float(self.fuel[i]),
+                 float(self.water[i]), float(self.byproduct[i]))
+                for i, (generator, fuel) in enumerate(self.options)]
+
+
+class CapacityPlan:
+
+    def __init__(self, demand: Dict[Item, float], extraction: ExtractionPlan,
+                 power: PowerPlan) -> None:
+        self.demand = demand
+        self.extraction = extraction
+        self.power = power
+
+
+class CapacityPlanner:
+    """ Precomputes miner rates and generator fuel figures of a World, so a
+    plan is sized with a few array operations over its leaf demands.
+    """
+
+    def __init__(self, world: World) -> None:
+        self.world = world
+        self.miners = list(world.miners)
+        self.items = []
+        self.item_ids = {}
+        for miner in self.miners:
+            for item in miner.allowed_resources:
+                if item.classname not in self.item_ids:
+                    self.item_ids[item.classname] = len(self.items)
+                    self.items.append(item)
+        # extraction rate per minute on a normal node at 100% clock
+        self.rates = np.zeros((len(self.items), len(self.miners)))
+        for m, miner in enumerate(self.miners):
+            for item in miner.allowed_resources:
+                resource = world.get_resource(item)
+                speed = float(resource.speed) if resource else 1.0
+                self.rates[self.item_ids[item.classname], m] = (
+                    float(miner.rate(item))*speed)
+
+        self.options = [(generator, fuel) for generator in world.generators
+                        for fuel in generator.fuels
+                        if generator.power_production and
+                        fuel.item.energy_value]
+        self.power_production = np.array(
+            [float(g.power_production) for g, _ in self.options])
+        # MJ per item, or per m3 for liquids
+        self.energy = np.array(
+            [float(f.item.energy_value)*(LITERS_PER_M3 if f.item.liquid
+                                         else 1)
+             for _, f in self.options])
+        self.water_ratio = np.array(
+            [float(g.water_to_power_ratio) if f.supplemental_item else 0.0
+             for g, f in self.options])
+        self.byproduct_amount = np.array(
+            [float(f.byproduct_amount) if f.byproduct else 0.0
+             for _, f in self.options])
+
+    @staticmethod
+    def leaf_demand(graph: ProductionGraph) -> Dict[Item, float]:
+        """ Demand per minute of the raw nodes of a production graph. """
+        demand = {}
+        for node in graph.raw_nodes():
+            demand[node.item] = demand.get(node.item, 0) + float(node.amount)
+        return demand
+
+    def extraction(self, demand: Dict[Item, float],
+                   clock: float=1.0) -> ExtractionPlan:
+        """ Miners for demand (items or m3 per minute) with every miner at
+        clock, for each miner tier and node purity.
+        """
+        items = list(demand)
+        amounts = np.array([float(demand[x]) for x in items])
+        rates = np.zeros((len(items), len(self.miners)))
+        known = [i for i, item in enumerate(items)
+                 if item.classname in self.item_ids]
+        rates[known] = self.rates[[self.item_ids[items[i].classname]
+                                   for i in known]]
+        capacity = rates[:, :, None]*PURITY_MULTIPLIERS*clock
+        with np.errstate(divide='ignore', invalid='ignore'):
+            counts = np.where(capacity > 0,
+                              amounts[:, None, None]/capacity, np.nan)
+        return ExtractionPlan(items, amounts, self.miners, counts)
+
+    def power(self, power: float) -> PowerPlan:
+        """ Generators and fuel for power MW, for every generator fuel. """
+        generators = power/self.power_production
+        fuel = power/self.energy*60
+        water = power*self.water_ratio*60/LITERS_PER_M3
+        byproduct = fuel*self.byproduct_amount
+        return PowerPlan(power, self.options, generators, fuel, water,
+                         byproduct)
+
+    def plan(self, rate_plan, fuel: Item=None,
+             clock: float=1.0) -> CapacityPlan:
+        """ Sizes the supply of a planner.RatePlan. With fuel, its power is
+        generated from that fuel and the fuel and water burned are added to
+        the demand to extract.
+        """
+        demand = CapacityPlanner.leaf_demand(rate_plan.graph)
+        power = self.power(rate_plan.total_power)
+        if fuel is not None:
+            for item, amount in power.consumption(fuel).items():
+                demand[item] = demand.get(item, 0) + amount
+        return CapacityPlan(demand, self.extraction(demand, clock), power)
@@ -1,15 +1,16 @@
 from __future__ import annotations
 
+from collections import OrderedDict
 from decimal import Decimal
-from typing import List
-import math
-from diagrams import Diagram
-from diagrams.aws.ml import ApacheMxnetOnAWS as cube
-from diagrams.aws.enablement import ManagedServices as building_icon
+from fractions import Fraction
+from typing import Dict, List
 
 from world import World, Startup, Item, ItemAmount, Building, Recipe
 from error_handler import MyCustomError
+import instrumentation
+import numeric
 from tree import Tree, Node
+from graph import ProductionGraph, GraphNode
 
 
 def first(iterable, default=None, key=None):
@@ -24,24 +25,128 @@ def first(iterable, default=None, key=None):
     return default
 
 
+class UnitCostCache:
+    """ Bounded LRU cache of per-unit raw resource expansions, keyed by
+    (item, exact). Each entry keeps the recipe_generation of every item the
+    expansion went through and is dropped on a hit when one of them
+    changed, so changing a default recipe only invalidates expansions that
+    use it, and worlds never invalidate each other.
+    """
+    
+    def __init__(self, maxsize: int=1024) -> None:
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: tuple) -> tuple:
+        """ (cost, dependencies) of key, or None. """
+        entry = self.entries.get(key)
+        if entry is not None and any(
+                item.recipe_generation != generation
+                for item, generation in entry[1].items()):
+            del self.entries[key]
+            entry = None
+        if entry is None:
+            self.misses += 1
+            instrumentation.count('tree.unit_cost_cache.misses')
+            return None
+        self.hits += 1
+        instrumentation.count('tree.unit_cost_cache.hits')
+        self.entries.move_to_end(key)
+        return entry
+
+    def put(self, key: tuple, cost: Dict[Item, Decimal],
+            dependencies: Dict[Item, int]) -> None:
+        self.entries[key] = (cost, dependencies)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self.entries.clear()
+
+
 class TreeBuilder:
     
+    unit_cost_cache = UnitCostCache()
+    
+    @staticmethod
+    def unit_cost(item: Item, exact: bool=False) -> Dict[Item, Decimal]:
+        """ Raw resources needed for one unit of item following default
+        recipes. Items without a default recipe are raw and cost themselves.
+        With exact, amounts are Fractions. Results are memoized in
+        TreeBuilder.unit_cost_cache; the returned dict is a copy the caller
+        may change.
+        """
+        def expand(item: Item, visiting: set) -> tuple:
+            entry = TreeBuilder.unit_cost_cache.get((item, exact))
+            if entry is not None:
+                return entry
+            dependencies = {item: item.recipe_generation}
+            recipe = item.default_recipe
+            if recipe is None:
+                cost = {item: Fraction(1) if exact else 1}
+            else:
+                if item in visiting:
+                    raise MyCustomError(
+                        f'Default recipes of {item.name} form a cycle.')
+                visiting.add(item)
+                amount_produced = first(
+                    x.amount for x in recipe.products
+                    if x.item.classname == item.classname)
+                cost = {}
+                for ingredient in recipe.ingredients:
+                    factor = numeric.divide(ingredient.amount,
+                                            amount_produced, exact)
+                    ingredient_cost, ingredient_dependencies = expand(
+                        ingredient.item, visiting)
+                    dependencies.update(ingredient_dependencies)
+                    for raw, amount in ingredient_cost.items():
+                        cost[raw] = cost.get(raw, 0) + amount*factor
+                visiting.discard(item)
+            TreeBuilder.unit_cost_cache.put((item, exact), cost,
+                                            dependencies)
+            return cost, dependencies
+        
+        return dict(expand(item, set())[0])
+
+    @staticmethod
+    def disassemble_to_raw(item_amounts: List[ItemAmount], exact: bool=False
+                           ) -> List[ItemAmount]:
+        """ Total raw resources for item_amounts, scaled from unit costs. """
+        totals = {}
+        for item_amount in item_amounts:
+            requested = item_amount.amount
+            if exact:
+                requested = numeric.to_fraction(requested)
+            for raw, amount in TreeBuilder.unit_cost(
+                    item_amount.item, exact).items():
+                totals[raw] = totals.get(raw, 0) + amount*requested
+        return [ItemAmount(raw, amount) for raw, amount in totals.items()]
+
     @staticmethod
-    def disassemble_1_level(item_amounts: List[ItemAmount], recipe: Recipe=None
-                            ) -> List[ItemAmount]:
+    def disassemble_1_level(item_amounts: List[ItemAmount],
+                            recipe: Recipe=None,
+                            exact: bool=False) -> List[ItemAmount]:
         dissassembled_ingredients = []
         
         for item_amount in item_amounts:
             
             amount_param = item_amount.amount
+            if exact:
+                amount_param = numeric.to_fraction(amount_param)
             used_recipe = item_amount.item.default_recipe
             amount_produced = first(
                 x.amount for x in used_recipe.products
                 if x.item.classname == item_amount.item.classname)
             
             for ingredient in used_recipe.ingredients:
-                amount_required = (
-                    (ingredient.amount*amount_param)/amount_produced)
+                ingredient_amount = ingredient.amount
+                if exact:
+                    ingredient_amount = numeric.to_fraction(ingredient_amount)
+                amount_required = numeric.divide(
+                    ingredient_amount*amount_param, amount_produced, exact)
                 item_required = ingredient.item
                 dissassembled_ingredients.append(
                     ItemAmount(item_required, amount_required))
@@ -49,22 +154,44 @@ class TreeBuilder:
         return dissassembled_ingredients
             
 
-    def disassemble_to_root_building(self, item_amounts: List[ItemAmount]
-                                     ) -> List[object]:
+    def disassemble_to_root_building(self, item_amounts: List[ItemAmount],
+                                     exact: bool=False) -> List[object]:
+        with instrumentation.timer('tree.disassemble_to_root_building'):
+            return TreeBuilder._disassemble_to_root_building(item_amounts,
+                                                             exact)
+
+    @staticmethod
+    def _disassemble_to_root_building(item_amounts: List[ItemAmount],
+                                      exact: bool) -> Tree:
+        if exact:
+            item_amounts = [ItemAmount(x.item, numeric.to_fraction(x.amount))
+                            for x in item_amounts]
         root_recipe = item_amounts[0].item.default_recipe
         root_node = Node(data = item_amounts, 
                          building = root_recipe.buildings[0],
                          recipe = root_recipe)
         item_tree = Tree(root_node)
 
-        def recursive_disassemble(self, node: Node) -> Node:
-            if node.data is None:
-                return
+        # explicit stack of (node, classnames of the single-item nodes above
+        # it, depth), expanding each node once in pre-order
+        nodes_created = 1
+        max_depth = 0
+        stack = [(root_node, frozenset(), 0)]
+        while stack:
+            node, ancestors, depth = stack.pop()
+            max_depth = max(max_depth, depth)
             for item_amount in node.data:
                 if item_amount.item.default_recipe is None:
                     continue
+                if item_amount.item.classname in ancestors:
+                    raise MyCustomError(
+                        f'Default recipes of {item_amount.item.name} form a '
+                        'cycle; use solver.LinearSolver for cyclic recipes.')
+                if len(node.data) == 1:
+                    ancestors = ancestors | {item_amount.item.classname}
                 
-                decomposition = TreeBuilder.disassemble_1_level([item_amount])
+                decomposition = TreeBuilder.disassemble_1_level(
+                    [item_amount], exact=exact)
                 
                 for ingredient in decomposition:
                     ingredient_recipe = ingredient.item.default_recipe
@@ -75,151 +202,82 @@ class TreeBuilder:
                     node.add_child(Node(data = [ingredient], 
                                         building = building, 
                                         recipe=ingredient_recipe))
-                
-                for ingredient_it_amnt in node.child:
-                    recursive_disassemble(self, ingredient_it_amnt)
+                    nodes_created += 1
+            
+            stack.extend((child, ancestors, depth + 1)
+                         for child in reversed(node.child))
 
-        recursive_disassemble(self, root_node)
+        instrumentation.count('tree.expansions')
+        instrumentation.count('tree.nodes_created', nodes_created)
+        instrumentation.record_max('tree.max_depth', max_depth)
+        if exact:
+            numeric.check_exact(
+                x.amount for node in item_tree.iter_preorder()
+                for x in node.data)
         return item_tree
     
     def tree_to_node_list(self, tree: Tree) -> List:
-        node_list = []
-        def recursion(node: Node):
-            node_list.append(node)
-            if node.child is None:
-                return
-            for child in node.child:
-                recursion(child)
-        recursion(tree.root)
-        return node_list
-
-    def tree_to_node_compact(self, tree: Tree) -> List:
-        
-        zip_list = []
-        node_list = self.tree_to_node_list(tree)
-        
-        def search_zip(self, recipe_classname):
-            for r_itemamount in zip_list:
-                if r_itemamount.recipe is None:
-                    return None
-                if node.recipe.classname == recipe_classname:
-                    return node
-            return None
-            
-        
-        for node in node_list:
-            pass
-            #if search_zip(self, )
-            
+        return list(tree.iter_preorder())
 
-class CalcUtils:
+    def tree_to_node_compact(self, tree: Tree) -> List[GraphNode]:
+        """ Nodes of the tree merged by (item, recipe), amounts summed. """
+        return ProductionGraph.from_tree(tree).nodes
 
     @staticmethod
-    def __decimal_places(number: Decimal) -> Decimal:
-        if(isinstance(number, Decimal)):
-            return abs(Decimal(number).normalize().as_tuple().exponent)
-        return 0
-    
-    @staticmethod
-    def __lcm_int(numbers: List(int)) -> int:
-        return math.lcm(*numbers)
-    
-    @staticmethod
-    def __lcm_decimal(numbers: List(Decimal)) -> int:
-        max_decimal_places = abs(max(
-            CalcUtils.__decimal_places(number) for number in numbers))
-        integers = (
-            int(number * (10**max_decimal_places)) for number in numbers)
-        integers = list(integers)
-        lcm = CalcUtils.__lcm_int(integers)
-        lcm = lcm // 10**max_decimal_places
-        return lcm
-        
+    def build_graph(item_amounts: List[ItemAmount]) -> ProductionGraph:
+        """ Aggregated production DAG for item_amounts, read as rates. """
+        return ProductionGraph.build(item_amounts)
+            
+
+class CalcUtils:
     
     @staticmethod
-    def lcm(numbers: List()) -> int:
+    def lcm(numbers: List()) -> Fraction:
         """ Cálculo de lcm capaz de lidar com números decimais """
-                              
-        if not(all((isinstance(x, int) or isinstance(x, Decimal)) for x in 
-                   numbers)):
-            raise MyCustomError('Only integers and decimals allowed in lcm.')
-        
-        lcm = 0
-        if(any(isinstance(x, Decimal)) for x in numbers):
-            lcm = CalcUtils.__lcm_decimal(numbers)
-        else:
-            lcm = CalcUtils.__lcm_int(numbers)
-             
-        return lcm
+        if not all(isinstance(x, (int, float, Decimal, Fraction)) 
+                   for x in numbers):
+            raise MyCustomError('Only numbers allowed in lcm.')
+        return numeric.lcm(numbers)
+
+    @staticmethod
+    def integer_ratio(numbers: List()) -> List[int]:
+        """ Smallest whole numbers in the proportion of numbers. """
+        return numeric.integer_ratio(numbers)
    
     
 class Search:
     
     @staticmethod
     def print_recipe_by_product(world: World, product_name: str) -> None:
-        for recipe in world.recipes:
-            for product in recipe.products:
-                if(product_name == product.item.name):
-                    print(recipe)
+        for recipe in Search.find_recipes_by_product(world, product_name):
+            print(recipe)
 
     @staticmethod
-    def find_item_by_name(world: World, product_name: str) -> None:
-        for item in world.items:
-            if(product_name == item.name):
-                return item
-        return None
+    def find_recipes_by_product(world: World, product_name: str
+                                ) -> List[Recipe]:
+        item = Search.find_item_by_name(world, product_name)
+        if item is None:
+            return []
+        return world.recipes_producing(item)
 
+    @staticmethod
+    def query(world: World, text: str, kinds: tuple=None, 
+              limit: int=10) -> List[object]:
+        """ Ranked prefix, token and typo-tolerant search over item, recipe 
+        and building names, slugs, classnames and building descriptions.
+        kinds restricts results to 'item', 'recipe' and/or 'building'.
+        """
+        return world.search_index().search(text, kinds, limit)
 
-class TreeVisualization():
-    
-    def __init__(self, tree: Tree) -> None:
-        self.tree = tree
-    
-    def draw_simple_only_ingredients(self):
-        root = self.tree.root
-        root_name = root.__str__()
-        diagram_name = f'Recipe for producing {root.__str__()}.'
-        with Diagram(name = diagram_name, direction = 'BT'):
-            def recursion(viz_item, node):
-                for item in node.child:
-                    #node_items.append(item)
-                    new_viz_item = cube(label = item.__str__())#'1')
-                    viz_item << new_viz_item
-                    if item.child is not None:
-                        recursion(new_viz_item, item)
-                return viz_item
-                
-            
-            
-            viz = cube(root_name)
-            viz = recursion(viz, self.tree.root)
-            #viz >> viz2
-            #cube(root_name).connect(cube, recursion(cube, self.tree.root))
-            
-    def draw_simple(self):
-        root = self.tree.root
-        root_name = root.__str__()
-        diagram_name = f'Recipe for producing {root.__str__()}.'
-        with Diagram(name = diagram_name, direction = 'BT'):
-            def recursion(viz_item, node):
-                
-                if node.building is not None:
-                    new_viz_building = building_icon(
-                        label = node.building.name)
-                    viz_item << new_viz_building
-                
-                for item in node.child:
-                    new_viz_item = cube(label = item.__str__())
-                    if(node.building is not None):
-                        new_viz_building << new_viz_item
-                    else:
-                        print("tava None")
-                        viz_item << new_viz_item
-                    if item.child is not None:
-                        recursion(new_viz_item, item)
-                return viz_item
-            
-            viz = cube(root_name)
-            viz = recursion(viz, self.tree.root)
-            
-        
+    @staticmethod
+    def find_item_by_name(world: World, product_name: str) -> Item:
+        return world.items_by_name.get(product_name.lower())
+
+
+def __getattr__(name: str):
+    # the diagrams-based visualization is only imported when requested, so
+    # planning code does not pay for it
+    if name == 'TreeVisualization':
+        from visualization import TreeVisualization
+        return TreeVisualization
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
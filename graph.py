@@ -0,0 +1,251 @@
+from __future__ import annotations
+
+from typing import Dict, List
+
+from world import Item, ItemAmount, Building, Recipe
+from error_handler import MyCustomError
+import numeric
+from tree import Tree, Node
+
+
+class GraphNode:
+    """ One (item, recipe) pair of a production graph. Amounts are read as
+    rates per minute: crafts is the number of recipe runs per minute and
+    machines the number of buildings of each type needed at 100% clock.
+    Raw items have no recipe and no machines.
+    """
+
+    __slots__ = ('index', 'item', 'recipe', 'amount', 'crafts', 'machines')
+
+    def __init__(self, index: int, item: Item, recipe: Recipe=None) -> None:
+        self.index = index
+        self.item = item
+        self.recipe = recipe
+        self.amount = 0
+        self.crafts = 0
+        self.machines = {}
+
+    def __str__(self) -> str:
+        return f'{self.amount} {self.item.name}'
+
+    @property
+    def building(self) -> Building:
+        if self.recipe is None or not self.recipe.buildings:
+            return None
+        return self.recipe.buildings[0]
+
+
+class GraphEdge:
+    """ Flow of item from producer to consumer, in items per minute. """
+
+    __slots__ = ('consumer', 'producer', 'flow')
+
+    def __init__(self, consumer: int, producer: int, flow) -> None:
+        self.consumer = consumer
+        self.producer = producer
+        self.flow = flow
+
+
+class ProductionGraph:
+    """ Production DAG where every (item, recipe) pair appears once, with the
+    demand of every path summed into it.
+    """
+
+    def __init__(self) -> None:
+        self.nodes = []
+        self.edges = []
+        self.node_index = {}
+        self.edge_index = {}
+        self.roots = []
+
+    def get_node(self, item: Item, recipe: Recipe=None) -> GraphNode:
+        key = (item.classname, recipe.classname if recipe else None)
+        node = self.node_index.get(key)
+        if node is None:
+            node = GraphNode(len(self.nodes), item, recipe)
+            self.nodes.append(node)
+            self.node_index[key] = node
+        return node
+
+    def add_flow(self, consumer: GraphNode, producer: GraphNode,
+                 flow) -> None:
+        key = (consumer.index, producer.index)
+        edge = self.edge_index.get(key)
+        if edge is None:
+            edge = GraphEdge(consumer.index, producer.index, 0)
+            self.edges.append(edge)
+            self.edge_index[key] = edge
+        edge.flow += flow
+
+    @staticmethod
+    def build(item_amounts: List[ItemAmount], exact: bool=False,
+              selection: dict=None) -> ProductionGraph:
+        """ Builds the graph for target rates following default recipes, or
+        the recipes in selection (keyed by item classname, None for raw).
+        Items are visited in topological order, so each node propagates its
+        total demand to its ingredients exactly once. With exact, rates and
+        machine counts are Fractions.
+        """
+        selection = selection if selection is not None else {}
+        graph = ProductionGraph()
+        order = ProductionGraph.topological_items(
+            [x.item for x in item_amounts], selection)
+        demand = {}
+        for item_amount in item_amounts:
+            item = item_amount.item
+            amount = item_amount.amount
+            if exact:
+                amount = numeric.to_fraction(amount)
+            demand[item] = demand.get(item, 0) + amount
+            node = graph.get_node(
+                item, ProductionGraph.recipe_for(item, selection))
+            if node not in graph.roots:
+                graph.roots.append(node)
+
+        for item in order:
+            node = graph.get_node(
+                item, ProductionGraph.recipe_for(item, selection))
+            node.amount = demand.get(item, 0)
+            recipe = node.recipe
+            if recipe is None:
+                continue
+            amount_produced = ProductionGraph.amount_produced(recipe, item)
+            node.crafts = numeric.divide(node.amount, amount_produced, exact)
+            if node.building is not None:
+                node.machines = {
+                    node.building: numeric.divide(node.crafts*recipe.time, 60,
+                                                  exact)}
+            for ingredient in recipe.ingredients:
+                ingredient_amount = ingredient.amount
+                if exact:
+                    ingredient_amount = numeric.to_fraction(ingredient_amount)
+                flow = node.crafts*ingredient_amount
+                ingredient_item = ingredient.item
+                demand[ingredient_item] = (
+                    demand.get(ingredient_item, 0) + flow)
+                graph.add_flow(
+                    node,
+                    graph.get_node(ingredient_item, ProductionGraph.recipe_for(
+                        ingredient_item, selection)),
+                    flow)
+        if exact:
+            numeric.check_exact(
+                [x.amount for x in graph.nodes]
+                + [x.crafts for x in graph.nodes if x.recipe is not None]
+                + [x.flow for x in graph.edges]
+                + [y for x in graph.nodes for y in x.machines.values()])
+        return graph
+
+    @staticmethod
+    def recipe_for(item: Item, selection: dict=None) -> Recipe:
+        """ Recipe used for item: the one in selection (keyed by item
+        classname, None meaning raw) or else the item's default recipe.
+        """
+        if selection and item.classname in selection:
+            return selection[item.classname]
+        return item.default_recipe
+
+    @staticmethod
+    def amount_produced(recipe: Recipe, item: Item):
+        for product in recipe.products:
+            if product.item.classname == item.classname:
+                return product.amount
+        raise MyCustomError(f'{recipe.name} does not produce {item.name}.')
+
+    @staticmethod
+    def topological_items(targets: List[Item],
+                          selection: dict=None) -> List[Item]:
+        """ Items reachable from targets through default (or selected)
+        recipes, with every consumer before the items it consumes.
+        """
+        selection = selection if selection is not None else {}
+        post_order = []
+        state = {}
+        for target in targets:
+            if target in state:
+                continue
+            state[target] = 1
+            stack = [(target, 0)]
+            while stack:
+                item, position = stack.pop()
+                recipe = ProductionGraph.recipe_for(item, selection)
+                ingredients = recipe.ingredients if recipe else []
+                if position < len(ingredients):
+                    stack.append((item, position + 1))
+                    child = ingredients[position].item
+                    if state.get(child) == 1:
+                        raise MyCustomError(
+                            f'Recipes of {child.name} form a cycle; use '
+                            'solver.LinearSolver for cyclic recipes.')
+                    if child not in state:
+                        state[child] = 1
+                        stack.append((child, 0))
+                else:
+                    state[item] = 2
+                    post_order.append(item)
+        post_order.reverse()
+        return post_order
+
+    @staticmethod
+    def from_tree(tree: Tree) -> ProductionGraph:
+        """ Merges the nodes of a TreeBuilder tree by (item, recipe). The
+        children of a node holding several targets come target by target,
+        one per ingredient of its recipe, and flow into that target.
+        """
+        graph = ProductionGraph()
+        stack = [(tree.root, None)]
+        while stack:
+            node, parent = stack.pop()
+            merged = []
+            for item_amount in node.data:
+                recipe = node.recipe
+                if len(node.data) > 1:
+                    recipe = item_amount.item.default_recipe
+                graph_node = graph.get_node(item_amount.item, recipe)
+                graph_node.amount += item_amount.amount
+                merged.append(graph_node)
+                if parent is None and graph_node not in graph.roots:
+                    graph.roots.append(graph_node)
+                elif parent is not None:
+                    graph.add_flow(parent, graph_node, item_amount.amount)
+            consumers = [graph_node for graph_node in merged
+                         if graph_node.recipe is not None
+                         for _ in graph_node.recipe.ingredients]
+            if len(consumers) != len(node.child):
+                raise MyCustomError('The tree was not built by TreeBuilder: '
+                                    'children do not match the ingredients.')
+            stack.extend(zip(node.child, consumers))
+        for graph_node in graph.nodes:
+            if graph_node.recipe is None:
+                continue
+            graph_node.crafts = graph_node.amount/ProductionGraph.\
+                amount_produced(graph_node.recipe, graph_node.item)
+            if graph_node.building is not None:
+                graph_node.machines = {
+                    graph_node.building:
+                        graph_node.crafts*graph_node.recipe.time/60}
+        return graph
+
+    def raw_nodes(self) -> List[GraphNode]:
+        return [node for node in self.nodes if node.recipe is None]
+
+    def to_arrays(self) -> Dict[str, 'np.ndarray']:
+        """ Flat arrays for vectorized consumers. Node arrays are indexed by
+        GraphNode.index; edges are given as consumer/producer index pairs.
+        """
+        import numpy as np
+        
+        return {
+            'amount': np.array([float(x.amount) for x in self.nodes]),
+            'crafts': np.array([float(x.crafts) for x in self.nodes]),
+            'machines': np.array([float(sum(x.machines.values()))
+                                  for x in self.nodes]),
+            'recipe_time': np.array(
+                [float(x.recipe.time) if x.recipe else 0.0
+                 for x in self.nodes]),
+            'edge_consumer': np.array([x.consumer for x in self.edges],
+                                      dtype=np.int64),
+            'edge_producer': np.array([x.producer for x in self.edges],
+                                      dtype=np.int64),
+            'edge_flow': np.array([float(x.flow) for x in self.edges]),
+            }
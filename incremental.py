@@ -0,0 +1,149 @@
+from __future__ import annotations
+
+from typing import Dict, List
+
+from world import Item, ItemAmount, Recipe
+from error_handler import MyCustomError
+from graph import ProductionGraph
+
+# Demand changes smaller than this are not propagated.
+TOLERANCE = 1e-9
+
+
+class IncrementalPlanner:
+    """ Keeps the last plan (demand per item in items per minute) and updates
+    it by pushing only the deltas of a change through the items downstream
+    of it, in topological order.
+
+    Every change returns the items whose demand or recipe changed, mapped to
+    their new demand. Resource caps do not change the plan; shortages()
+    lists capped items whose demand exceeds their cap.
+    """
+
+    def __init__(self, targets: List[ItemAmount]=None,
+                 selection: dict=None) -> None:
+        self.selection = dict(selection) if selection is not None else {}
+        self.targets = {}
+        self.demand = {}
+        self.caps = {}
+        if targets:
+            deltas = {}
+            for item_amount in targets:
+                item = item_amount.item
+                self.targets[item] = (self.targets.get(item, 0)
+                                      + item_amount.amount)
+                deltas[item] = deltas.get(item, 0) + item_amount.amount
+            self._propagate(deltas)
+
+    def recipe_for(self, item: Item) -> Recipe:
+        return ProductionGraph.recipe_for(item, self.selection)
+
+    def set_target(self, item: Item, rate) -> Dict[Item, float]:
+        """ Sets the requested output rate of item (0 removes it). Nothing
+        changes when the recipes below item form a cycle.
+        """
+        order = self._order([item])
+        delta = rate - self.targets.get(item, 0)
+        if rate:
+            self.targets[item] = rate
+        else:
+            self.targets.pop(item, None)
+        return self._propagate({item: delta}, order)
+
+    def set_recipe(self, item: Item, recipe: Recipe) -> Dict[Item, float]:
+        """ Swaps the recipe used for item (None makes it raw). The
+        ingredients of the old recipe lose their share of the demand and
+        those of the new recipe gain it.
+        """
+        old_recipe = self.recipe_for(item)
+        if recipe is old_recipe:
+            return {}
+        if recipe is not None:
+            ProductionGraph.amount_produced(recipe, item)
+        self.selection[item.classname] = recipe
+        starts = [item]
+        if old_recipe is not None:
+            starts += [x.item for x in old_recipe.ingredients]
+        try:
+            order = self._order(starts)
+        except MyCustomError:
+            self.selection[item.classname] = old_recipe
+            raise
+        demand = self.demand.get(item, 0)
+        deltas = {}
+        for used_recipe, sign in ((old_recipe, -1), (recipe, 1)):
+            if used_recipe is None or not demand:
+                continue
+            runs = demand/ProductionGraph.amount_produced(used_recipe, item)
+            for ingredient in used_recipe.ingredients:
+                deltas[ingredient.item] = (
+                    deltas.get(ingredient.item, 0)
+                    + sign*runs*ingredient.amount)
+        changed = self._propagate(deltas, order)
+        changed[item] = self.demand.get(item, 0)
+        return changed
+
+    def cap_resource(self, item: Item, limit) -> Dict[Item, float]:
+        """ Caps the supply of item per minute (None removes the cap).
+        Returns item when its shortage status changed.
+        """
+        was_short = item in self.shortages()
+        if limit is None:
+            self.caps.pop(item.classname, None)
+        else:
+            self.caps[item.classname] = limit
+        if (item in self.shortages()) != was_short:
+            return {item: self.demand.get(item, 0)}
+        return {}
+
+    def shortages(self) -> Dict[Item, float]:
+        """ Demand above the cap of every capped item. """
+        shortages = {}
+        for item, demand in self.demand.items():
+            cap = self.caps.get(item.classname)
+            if cap is not None and demand > cap + TOLERANCE:
+                shortages[item] = demand - cap
+        return shortages
+
+    def machines(self, item: Item) -> float:
+        """ Machines at 100% clock running the recipe of item. """
+        recipe = self.recipe_for(item)
+        if recipe is None:
+            return 0
+        runs = (self.demand.get(item, 0)
+                / ProductionGraph.amount_produced(recipe, item))
+        return runs*recipe.time/60
+
+    def _order(self, items: List[Item]) -> List[Item]:
+        """ Items downstream of items with consumers before ingredients. """
+        return ProductionGraph.topological_items(items, self.selection)
+
+    def _propagate(self, deltas: dict,
+                   order: List[Item]=None) -> Dict[Item, float]:
+        """ Adds deltas to the demand of their items and pushes them to the
+        ingredients, visiting order (by default the items downstream of the
+        deltas) once.
+        """
+        if order is None:
+            order = self._order(list(deltas))
+        changed = {}
+        pending = dict(deltas)
+        for item in order:
+            delta = pending.pop(item, 0)
+            if abs(delta) <= TOLERANCE:
+                continue
+            demand = self.demand.get(item, 0) + delta
+            if abs(demand) <= TOLERANCE:
+                self.demand.pop(item, None)
+                demand = 0
+            else:
+                self.demand[item] = demand
+            changed[item] = demand
+            recipe = self.recipe_for(item)
+            if recipe is None:
+                continue
+            runs = delta/ProductionGraph.amount_produced(recipe, item)
+            for ingredient in recipe.ingredients:
+                pending[ingredient.item] = (pending.get(ingredient.item, 0)
+                                            + runs*ingredient.amount)
+        return changed
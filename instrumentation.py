@@ -0,0 +1,139 @@
+""" Timers and counters for setup, planning and rendering.
+
+Disabled by default; set SATISFACTORY_INSTRUMENT=1 or call enable(). While
+disabled, timer() hands out one shared no-op context manager and the other
+functions return after reading the enabled flag, so the hooks left in hot
+paths cost a global lookup and a branch.
+
+    import instrumentation
+    instrumentation.enable()
+    world = Startup.setup_world('my world')
+    print(instrumentation.export_json())
+
+    with instrumentation.profile('setup.prof'):    # pstats / snakeviz file
+        Startup.setup_world('my world', use_snapshot=False)
+"""
+from __future__ import annotations
+
+import json
+import os
+import time
+from contextlib import contextmanager
+from typing import Dict
+
+enabled = os.environ.get('SATISFACTORY_INSTRUMENT', '') not in ('', '0')
+
+# name -> [calls, total seconds, max seconds]
+_timers = {}
+# name -> value
+_counters = {}
+# name -> highest value recorded
+_maxima = {}
+
+
+class _Timer:
+
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self) -> _Timer:
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        elapsed = time.perf_counter() - self.start
+        stats = _timers.get(self.name)
+        if stats is None:
+            _timers[self.name] = [1, elapsed, elapsed]
+        else:
+            stats[0] += 1
+            stats[1] += elapsed
+            if elapsed > stats[2]:
+                stats[2] = elapsed
+
+
+class _Disabled:
+
+    __slots__ = ()
+
+    def __enter__(self) -> _Disabled:
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        pass
+
+
+_DISABLED = _Disabled()
+
+
+def enable() -> None:
+    global enabled
+    enabled = True
+
+
+def disable() -> None:
+    global enabled
+    enabled = False
+
+
+def reset() -> None:
+    _timers.clear()
+    _counters.clear()
+    _maxima.clear()
+
+
+def timer(name: str):
+    """ Context manager adding the time of its block to timer name. """
+    if not enabled:
+        return _DISABLED
+    return _Timer(name)
+
+
+def count(name: str, value: int=1) -> None:
+    if enabled:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def record_max(name: str, value) -> None:
+    if enabled and (name not in _maxima or value > _maxima[name]):
+        _maxima[name] = value
+
+
+def report() -> Dict[str, dict]:
+    """ Everything recorded so far, in plain types. """
+    return {
+        'timers': {name: {'calls': calls, 'total_ms': total*1e3,
+                          'mean_ms': total/calls*1e3, 'max_ms': longest*1e3}
+                   for name, (calls, total, longest)
+                   in sorted(_timers.items())},
+        'counters': dict(sorted(_counters.items())),
+        'maxima': dict(sorted(_maxima.items())),
+        }
+
+
+def export_json(path: str=None) -> str:
+    """ report() as JSON, also written to path when given. """
+    text = json.dumps(report(), indent=2)
+    if path is not None:
+        with open(path, 'w', encoding='utf-8') as report_file:
+            report_file.write(text)
+    return text
+
+
+@contextmanager
+def profile(path: str):
+    """ Runs the block under cProfile and dumps the stats to path, in the
+    format read by pstats.Stats and snakeviz. Works whether or not the
+    timers are enabled.
+    """
+    import cProfile
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
@@ -1,5 +1,6 @@
 from world import World, Startup, Item, ItemAmount, Building, Recipe
-from designer import TreeBuilder, Search, TreeVisualization
+from designer import TreeBuilder, Search
+from visualization import TreeVisualization
 
 
 world = Startup().setup_world('my world')
@@ -0,0 +1,121 @@
+""" Exact ratio arithmetic for recipe math.
+
+Amounts come from JSON as ints and floats. Exact code paths turn them into
+Fractions through their decimal text, so 0.1 becomes 1/10 instead of the
+binary float value, and keep every ratio as integer numerator/denominator.
+The float_* functions are vectorized NumPy counterparts for when exactness is
+not needed; NumPy is only imported when they are called.
+"""
+from __future__ import annotations
+
+import math
+from decimal import Decimal
+from fractions import Fraction
+from typing import List
+
+from error_handler import MyCustomError
+
+
+def to_fraction(value) -> Fraction:
+    if isinstance(value, Fraction):
+        return value
+    if isinstance(value, int):
+        return Fraction(value)
+    if isinstance(value, float):
+        if value.is_integer():
+            return Fraction(int(value))
+        return Fraction(repr(value))
+    if isinstance(value, Decimal):
+        return Fraction(value)
+    raise MyCustomError(f'Cannot use {value!r} as an exact amount.')
+
+
+def simplify(value: Fraction):
+    """ Returns an int when the fraction is a whole number. """
+    if value.denominator == 1:
+        return value.numerator
+    return value
+
+
+def lcm(numbers: List) -> Fraction:
+    """ Least common multiple of rationals: the smallest positive value that
+    is a whole multiple of every number.
+    """
+    fractions = [to_fraction(x) for x in numbers]
+    if not fractions:
+        raise MyCustomError('lcm needs at least one number.')
+    numerator = math.lcm(*(x.numerator for x in fractions))
+    denominator = math.gcd(*(x.denominator for x in fractions))
+    return simplify(Fraction(numerator, denominator))
+
+
+def gcd(numbers: List) -> Fraction:
+    """ Greatest common divisor of rationals. """
+    fractions = [to_fraction(x) for x in numbers]
+    if not fractions:
+        raise MyCustomError('gcd needs at least one number.')
+    numerator = math.gcd(*(x.numerator for x in fractions))
+    denominator = math.lcm(*(x.denominator for x in fractions))
+    return simplify(Fraction(numerator, denominator))
+
+
+def integer_ratio(numbers: List) -> List[int]:
+    """ Smallest whole numbers in the same proportion as numbers, e.g. the
+    machine counts of a perfectly balanced layout.
+    """
+    fractions = [to_fraction(x) for x in numbers]
+    denominator = math.lcm(*(x.denominator for x in fractions))
+    scaled = [x.numerator*(denominator//x.denominator) for x in fractions]
+    common = math.gcd(*scaled) or 1
+    return [x//common for x in scaled]
+
+
+# Largest scaled magnitude the float_* functions accept: floats are exact
+# integers up to 2**53, and the int64 cast must not wrap around.
+FLOAT_SCALED_LIMIT = 2**53
+
+
+def _scaled(numbers, decimals: int) -> 'np.ndarray':
+    """ numbers*10**decimals rounded to int64, raising when out of range. """
+    import numpy as np
+    scaled = np.rint(np.asarray(numbers, dtype=np.float64)*10**decimals)
+    if scaled.size and not (np.abs(scaled) <= FLOAT_SCALED_LIMIT).all():
+        raise MyCustomError(
+            f'Numbers too large (or not finite) to scale by 10**{decimals}; '
+            'use the exact functions instead.')
+    return scaled.astype(np.int64)
+
+
+def float_integer_ratio(numbers, decimals: int=6) -> 'np.ndarray':
+    """ Vectorized integer_ratio for floats, exact up to decimals places. """
+    import numpy as np
+    scaled = _scaled(numbers, decimals)
+    common = np.gcd.reduce(scaled[scaled != 0]) if scaled.any() else 1
+    return scaled//common
+
+
+def float_lcm(numbers, decimals: int=6) -> float:
+    """ lcm for floats, exact up to decimals places. The scaling is
+    vectorized; the reduction uses Python ints, as the lcm of many int64
+    values can overflow silently.
+    """
+    scaled = _scaled(numbers, decimals)
+    return math.lcm(*scaled.tolist())/10**decimals
+
+
+def check_exact(values) -> None:
+    """ Raises when a value of an exact computation is not a Fraction, e.g.
+    a float amount from JSON multiplied in without to_fraction.
+    """
+    for value in values:
+        if not isinstance(value, Fraction):
+            raise MyCustomError(f'Inexact amount {value!r} in an exact '
+                                'computation.')
+
+
+def divide(numerator, denominator, exact: bool=False):
+    """ numerator/denominator, as a Fraction when exact. """
+    if exact:
+        return to_fraction(numerator)/to_fraction(denominator)
+    return numerator/denominator
+
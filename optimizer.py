@@ -0,0 +1,183 @@
+from __future__ import annotations
+
+from typing import Dict, List
+
+import numpy as np
+from scipy import sparse
+from scipy.optimize import linprog
+
+try:
+    import highspy
+except ImportError:
+    highspy = None
+
+import satisfactory_parser as sp
+from world import World, Item, ItemAmount, Recipe
+from error_handler import MyCustomError
+from solver import RecipeMatrix, Solution
+
+OBJECTIVES = ('resources', 'power', 'buildings', 'sink_points')
+# Cost put on the variables an objective does not weigh, so ties are broken
+# towards plans without idle machines or wasted resources.
+TIE_BREAK = 1e-6
+# LP solutions are only accurate to the solver's feasibility tolerance.
+TOLERANCE = 1e-6
+
+
+class Optimizer:
+    """ Chooses recipes, alternates included, with a linear program over the
+    recipe matrix. Variables are machines per recipe (at 100% clock) and the
+    supply per minute of every extractable item (by default the resources 
+    and miner sections of the dataset; pass extractable to add gathered 
+    items such as Leaves). Constraints ask net output to cover the targets, 
+    with surplus allowed, and supply to stay under the given limits.
+
+    When the optional highspy package is installed one HiGHS model is kept
+    and only its costs and bounds change between queries, so each solve
+    starts from the previous basis. Otherwise scipy's HiGHS is called cold.
+    """
+
+    def __init__(self, world: World, recipes: List[Recipe]=None,
+                 extractable: List[str]=None, file_dir: str=None) -> None:
+        self.world = world
+        if recipes is None:
+            recipes = [recipe for recipe in world.recipes
+                       if recipe.buildings and recipe.products]
+        self.matrix = RecipeMatrix(world, recipes)
+        if extractable is None and world.resources:
+            extractable = {x.item.classname for x in world.resources}
+            for miner in world.miners:
+                extractable.update(x.classname 
+                                   for x in miner.allowed_resources)
+        if extractable is None:
+            extractable = Optimizer.extractable_resources(file_dir)
+        self.supply_items = [item for item in self.matrix.items
+                             if item.classname in extractable]
+        supply_rows = [self.matrix.item_ids[x.classname]
+                       for x in self.supply_items]
+        supply = sparse.csc_matrix(
+            (np.ones(len(supply_rows)),
+             (supply_rows, range(len(supply_rows)))),
+            shape=(len(self.matrix.items), len(supply_rows)))
+        self.constraints = sparse.hstack(
+            [self.matrix.matrix, supply]).tocsc()
+        self.recipe_count = len(self.matrix.recipes)
+        self.power = np.array([
+            float(recipe.buildings[0].power_consumption or 0)
+            for recipe in self.matrix.recipes])
+        self._model = None
+
+    @staticmethod
+    def extractable_resources(file_dir: str=None) -> set:
+        """ Items listed in the resources section or mined by a miner. """
+        dataset = sp.load_dataset(file_dir)
+        extractable = set(dataset['resources'])
+        for miner in dataset['miners'].values():
+            extractable.update(miner['allowedResources'])
+        return extractable
+
+    def costs(self, objective: str, weights: Dict[str, float]=None
+              ) -> np.ndarray:
+        """ Objective coefficients for [machines, supply]. weights scales the
+        supply cost of items by classname for the resources objective.
+        """
+        if objective not in OBJECTIVES:
+            raise MyCustomError(
+                f'Unknown objective {objective}, use one of {OBJECTIVES}.')
+        weights = weights if weights is not None else {}
+        machines = np.full(self.recipe_count, TIE_BREAK)
+        supply = np.full(len(self.supply_items), TIE_BREAK)
+        if objective == 'resources':
+            supply = np.array([float(weights.get(x.classname, 1))
+                               for x in self.supply_items])
+        elif objective == 'power':
+            machines = self.power + TIE_BREAK
+        elif objective == 'buildings':
+            machines = np.ones(self.recipe_count)
+        elif objective == 'sink_points':
+            supply = np.array([float(x.sink_points or 0) + TIE_BREAK
+                               for x in self.supply_items])
+        return np.concatenate([machines, supply])
+
+    def bounds(self, limits: Dict[str, float]=None) -> tuple:
+        """ Column bounds; limits caps the supply per minute by classname. """
+        limits = limits if limits is not None else {}
+        lower = np.zeros(self.constraints.shape[1])
+        upper = np.full(self.constraints.shape[1], np.inf)
+        for i, item in enumerate(self.supply_items):
+            if item.classname in limits:
+                upper[self.recipe_count + i] = float(limits[item.classname])
+        return lower, upper
+
+    def optimize(self, targets: List[ItemAmount],
+                 objective: str='resources',
+                 limits: Dict[str, float]=None,
+                 weights: Dict[str, float]=None) -> Solution:
+        """ Best recipe mix producing targets (items per minute). """
+        costs = self.costs(objective, weights)
+        lower, upper = self.bounds(limits)
+        target_vector = self.matrix.item_vector(targets)
+        if highspy is not None:
+            values = self._run_highs(costs, lower, upper, target_vector)
+        else:
+            values = self._run_linprog(costs, lower, upper, target_vector)
+        if values is None:
+            return Solution(False, 'no recipe mix meets the targets within '
+                            'the resource limits')
+        return self._solution(values, target_vector)
+
+    def _run_linprog(self, costs, lower, upper, target_vector) -> np.ndarray:
+        result = linprog(costs, A_ub=-self.constraints, b_ub=-target_vector,
+                         bounds=np.column_stack([lower, upper]),
+                         method='highs')
+        if result.status != 0:
+            return None
+        return result.x
+
+    def _run_highs(self, costs, lower, upper, target_vector) -> np.ndarray:
+        columns = np.arange(len(costs), dtype=np.int32)
+        rows = np.arange(len(target_vector), dtype=np.int32)
+        row_upper = np.full(len(target_vector), highspy.kHighsInf)
+        col_upper = np.where(np.isinf(upper), highspy.kHighsInf, upper)
+        if self._model is None:
+            lp = highspy.HighsLp()
+            lp.num_col_ = len(costs)
+            lp.num_row_ = len(target_vector)
+            lp.col_cost_ = costs
+            lp.col_lower_ = lower
+            lp.col_upper_ = col_upper
+            lp.row_lower_ = target_vector
+            lp.row_upper_ = row_upper
+            lp.a_matrix_.format_ = highspy.MatrixFormat.kColwise
+            lp.a_matrix_.start_ = self.constraints.indptr
+            lp.a_matrix_.index_ = self.constraints.indices
+            lp.a_matrix_.value_ = self.constraints.data
+            self._model = highspy.Highs()
+            self._model.setOptionValue('output_flag', False)
+            self._model.passModel(lp)
+        else:
+            self._model.changeColsCost(len(columns), columns, costs)
+            self._model.changeColsBounds(len(columns), columns, lower,
+                                         col_upper)
+            self._model.changeRowsBounds(len(rows), rows, target_vector,
+                                         row_upper)
+        self._model.run()
+        if (self._model.getModelStatus()
+                != highspy.HighsModelStatus.kOptimal):
+            return None
+        return np.array(self._model.getSolution().col_value)
+
+    def _solution(self, values: np.ndarray,
+                  target_vector: np.ndarray) -> Solution:
+        rates = values[:self.recipe_count]
+        supply = values[self.recipe_count:]
+        net = self.constraints @ values - target_vector
+        machines = {recipe: float(rate)
+                    for recipe, rate in zip(self.matrix.recipes, rates)
+                    if rate > TOLERANCE}
+        raw = {item: float(amount)
+               for item, amount in zip(self.supply_items, supply)
+               if amount > TOLERANCE}
+        surplus = {self.matrix.items[i]: float(net[i])
+                   for i in np.flatnonzero(net > TOLERANCE)}
+        return Solution(True, machines=machines, raw=raw, surplus=surplus)
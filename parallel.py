@@ -0,0 +1,178 @@
+""" Planning across a process pool.
+
+Workers never receive pickled objects from the World: each one loads the
+compiled snapshot (see snapshot.py) once in its initializer, and tasks and
+results only carry classnames, numbers and arrays. Targets are split into
+independent parts in input order and results are merged back in that same
+order, so the output does not depend on which worker finished first.
+"""
+from __future__ import annotations
+
+import multiprocessing
+import os
+from typing import Dict, List
+
+import numpy as np
+
+import snapshot
+from world import Startup, World, ItemAmount
+from error_handler import MyCustomError
+from graph import ProductionGraph
+from batch import BatchPlanner, BatchResult
+
+# Per process state set by _init_worker.
+_world = None
+_selection = None
+_batch = None
+
+
+def selection_classnames(selection: dict) -> Dict[str, str]:
+    """ {item classname: recipe} as {item classname: recipe classname}. """
+    return {item: recipe.classname if recipe is not None else None
+            for item, recipe in selection.items()}
+
+
+def resolve_selection(world: World, selection: Dict[str, str]) -> dict:
+    return {item: world.get_recipe(recipe) if recipe is not None else None
+            for item, recipe in selection.items()}
+
+
+def _init_worker(path: str, selection: Dict[str, str]) -> None:
+    global _world, _selection, _batch
+    _world = snapshot.load(path)
+    _selection = resolve_selection(_world, selection)
+    _batch = None
+
+
+def _graph_summary(targets: List[tuple]) -> Dict[str, list]:
+    """ Plans (item classname, rate) targets in a worker and returns
+    {item classname: [recipe classname, rate, machines]}.
+    """
+    item_amounts = [ItemAmount(_world.get_item(classname), amount)
+                    for classname, amount in targets]
+    graph = ProductionGraph.build(item_amounts, selection=_selection)
+    return summarize(graph)
+
+
+def _batch_chunk(targets: np.ndarray) -> tuple:
+    global _batch
+    if _batch is None:
+        _batch = BatchPlanner(_world, _selection)
+    result = _batch.plan(targets)
+    return result.machines, result.raw
+
+
+def summarize(graph: ProductionGraph) -> Dict[str, list]:
+    summary = {}
+    for node in graph.nodes:
+        entry = summary.setdefault(
+            node.item.classname,
+            [node.recipe.classname if node.recipe else None, 0.0, 0.0])
+        entry[1] += float(node.amount)
+        entry[2] += float(sum(node.machines.values()))
+    return summary
+
+
+def merge_summaries(summaries: List[dict]) -> Dict[str, list]:
+    """ Sums summaries in list order, with items sorted by classname. """
+    merged = {}
+    for summary in summaries:
+        for classname, (recipe, amount, machines) in summary.items():
+            entry = merged.setdefault(classname, [recipe, 0.0, 0.0])
+            entry[1] += amount
+            entry[2] += machines
+    return dict(sorted(merged.items()))
+
+
+def partition(count: int, parts: int) -> List[range]:
+    """ Splits range(count) into at most parts contiguous ranges. """
+    parts = max(1, min(parts, count))
+    size, extra = divmod(count, parts)
+    ranges = []
+    start = 0
+    for part in range(parts):
+        end = start + size + (1 if part < extra else 0)
+        ranges.append(range(start, end))
+        start = end
+    return ranges
+
+
+class ParallelPlanner:
+    """ Process pool planner for one dataset. selection overrides default
+    recipes by item classname, as in LinearSolver. Use as a context manager
+    or call close().
+    """
+
+    def __init__(self, file_dir: str=None, processes: int=None,
+                 selection: dict=None, context: str=None) -> None:
+        self.world = Startup.setup_world('parallel', file_dir)
+        self.path = snapshot.ensure(self.world, file_dir)
+        self.processes = processes or os.cpu_count() or 1
+        selection = selection if selection is not None else {}
+        self.selection_names = selection_classnames(selection)
+        self.selection = resolve_selection(self.world, self.selection_names)
+        self._batch = None
+        self._pool = multiprocessing.get_context(context).Pool(
+            self.processes, initializer=_init_worker,
+            initargs=(self.path, self.selection_names))
+
+    def __enter__(self) -> ParallelPlanner:
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+    def _open_pool(self) -> multiprocessing.pool.Pool:
+        if self._pool is None:
+            raise MyCustomError('The planner was closed.')
+        return self._pool
+
+    @staticmethod
+    def _encode_targets(targets: List[ItemAmount]) -> List[tuple]:
+        return [(x.item.classname, float(x.amount)) for x in targets]
+
+    def plan_many(self, target_sets: List[List[ItemAmount]],
+                  chunksize: int=None) -> List[Dict[str, list]]:
+        """ Plans every target set on its own. Returns one summary per set,
+        {item classname: [recipe classname, rate, machines]}, in input
+        order.
+        """
+        pool = self._open_pool()
+        tasks = [ParallelPlanner._encode_targets(x) for x in target_sets]
+        if chunksize is None:
+            chunksize = max(1, len(tasks)//(self.processes*4))
+        return pool.map(_graph_summary, tasks, chunksize)
+
+    def plan(self, targets: List[ItemAmount]) -> Dict[str, list]:
+        """ Plans one set of targets by splitting it into parts planned in
+        parallel. Demand is linear in the targets, so the summed parts
+        equal the plan of the whole set.
+        """
+        pool = self._open_pool()
+        encoded = ParallelPlanner._encode_targets(targets)
+        parts = [[encoded[i] for i in part]
+                 for part in partition(len(encoded), self.processes)]
+        return merge_summaries(pool.map(_graph_summary, parts, 1))
+
+    def plan_batch(self, targets) -> BatchResult:
+        """ BatchPlanner.plan with the target rows split across workers. """
+        pool = self._open_pool()
+        if self._batch is None:
+            self._batch = BatchPlanner(self.world, self.selection)
+        if not isinstance(targets, np.ndarray):
+            targets = self._batch.target_array(targets)
+        if targets.ndim != 2 or targets.shape[1] != len(self.world.items):
+            raise MyCustomError(
+                f'Targets must have shape (n, {len(self.world.items)}).')
+        chunks = [targets[part.start:part.stop]
+                  for part in partition(targets.shape[0], self.processes)]
+        results = pool.map(_batch_chunk, chunks, 1)
+        return BatchResult(self._batch.recipes, self._batch.raw_items,
+                           np.vstack([x[0] for x in results]),
+                           np.vstack([x[1] for x in results]))
@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+from typing import Dict, List
+
+import numpy as np
+
+from world import ItemAmount
+from error_handler import MyCustomError
+from graph import ProductionGraph, GraphNode
+
+MIN_CLOCK = 0.01
+MAX_CLOCK = 2.5
+
+
+class RatePlan:
+    """ Machines and power for a production graph. Every array is indexed by
+    GraphNode.index; raw nodes have zero machines and power.
+
+    machines: fractional machine count at the requested clock.
+    whole_machines: machines rounded up.
+    clock: clock of each whole machine when the load is spread evenly.
+    power: MW drawn by the fractional machines at the requested clock.
+    whole_power: MW drawn by the whole machines at their even clock.
+    """
+
+    def __init__(self, graph: ProductionGraph, machines: np.ndarray,
+                 whole_machines: np.ndarray, clock: np.ndarray,
+                 power: np.ndarray, whole_power: np.ndarray) -> None:
+        self.graph = graph
+        self.machines = machines
+        self.whole_machines = whole_machines
+        self.clock = clock
+        self.power = power
+        self.whole_power = whole_power
+
+    @property
+    def total_power(self) -> float:
+        return float(self.power.sum())
+
+    @property
+    def total_whole_power(self) -> float:
+        return float(self.whole_power.sum())
+
+    def machines_by_building(self) -> Dict[str, float]:
+        """ Fractional machine count summed per building name. """
+        totals = {}
+        for node in self.graph.nodes:
+            if node.building is not None:
+                name = node.building.name
+                totals[name] = (totals.get(name, 0)
+                                + float(self.machines[node.index]))
+        return totals
+
+    def rows(self) -> List[tuple]:
+        """ (node, machines, whole machines, clock, power) per recipe node. """
+        return [(node, float(self.machines[node.index]),
+                 int(self.whole_machines[node.index]),
+                 float(self.clock[node.index]),
+                 float(self.power[node.index]))
+                for node in self.graph.nodes if node.recipe is not None]
+
+
+class RatePlanner:
+
+    @staticmethod
+    def plan(targets: List[ItemAmount], overclock=1.0,
+             selection: dict=None) -> RatePlan:
+        """ Plans target output rates in items per minute. overclock is a
+        clock for every machine (1.0 = 100%) or a dict from recipe classname
+        to clock, with 1.0 for recipes not listed. selection overrides the
+        recipe of items, e.g. Progression.selection(tier).
+        """
+        return RatePlanner.plan_graph(
+            ProductionGraph.build(targets, selection=selection), overclock)
+
+    @staticmethod
+    def plan_graph(graph: ProductionGraph, overclock=1.0) -> RatePlan:
+        arrays = graph.to_arrays()
+        crafts = arrays['crafts']
+        recipe_time = arrays['recipe_time']
+        clock = RatePlanner._clock_array(graph.nodes, overclock)
+        base_power = np.array([
+            float(node.building.power_consumption or 0)
+            if node.building is not None else 0.0 for node in graph.nodes])
+        exponent = np.array([
+            float(node.building.power_consumption_exponent)
+            if node.building is not None else 1.0 for node in graph.nodes])
+        speed = np.array([
+            float(node.building.manufacturing_speed)
+            if node.building is not None else 1.0 for node in graph.nodes])
+
+        machines = crafts*recipe_time/60/(speed*clock)
+        whole_machines = np.ceil(machines - 1e-9).astype(np.int64)
+        safe_whole = np.maximum(whole_machines, 1)
+        even_clock = np.where(whole_machines > 0,
+                              clock*machines/safe_whole, 0.0)
+        power = machines*base_power*np.power(clock, exponent)
+        whole_power = whole_machines*base_power*np.power(even_clock, exponent)
+        return RatePlan(graph, machines, whole_machines, even_clock, power,
+                        whole_power)
+
+    @staticmethod
+    def _clock_array(nodes: List[GraphNode], overclock) -> np.ndarray:
+        if isinstance(overclock, dict):
+            clock = np.array([
+                float(overclock.get(node.recipe.classname, 1.0))
+                if node.recipe is not None else 1.0 for node in nodes])
+        else:
+            clock = np.full(len(nodes), float(overclock))
+        if ((clock < MIN_CLOCK) | (clock > MAX_CLOCK)).any():
+            raise MyCustomError(
+                f'Clock speeds must be between {MIN_CLOCK} and {MAX_CLOCK}.')
+        return clock
@@ -0,0 +1,151 @@
+""" Recipe availability by progression.
+
+The schematics of a World are bound in topological order, so one pass over
+them gives every schematic its unlock closure (itself plus everything it
+requires, transitively) and its effective tier, the highest tier in that
+closure. The recipes available at each tier are then precomputed as
+cumulative frozensets, and the result for a set of bought schematics is
+cached, so a query is a dictionary lookup.
+
+Recipes that no schematic unlocks (the starting recipes) are always
+available.
+"""
+from __future__ import annotations
+
+from typing import Dict, Iterable, List
+
+from error_handler import MyCustomError
+from world import World, Item, Recipe, RecipePolicy
+
+
+class Unlocked:
+    """ Recipes available at one progression stage, with the indexes the
+    planners use. selection maps every item classname to the recipe chosen
+    for it by the default RecipePolicy among the available ones (None when
+    the item must be supplied raw) and can be passed to LinearSolver,
+    BatchPlanner, IncrementalPlanner or RatePlanner.
+    """
+
+    __slots__ = ('available', 'recipes', 'recipes_by_product', 'selection')
+
+    def __init__(self, world: World, available: frozenset) -> None:
+        self.available = available
+        self.recipes = [x for x in world.recipes if x.classname in available]
+        self.recipes_by_product = {}
+        for recipe in self.recipes:
+            for product in recipe.products:
+                self.recipes_by_product.setdefault(
+                    product.item.classname, []).append(recipe)
+        policy = RecipePolicy(available=available)
+        self.selection = {
+            item.classname: policy.choose(
+                item, self.recipes_by_product.get(item.classname, []))
+            for item in world.items}
+
+    def is_available(self, recipe: Recipe) -> bool:
+        return recipe.classname in self.available
+
+    def recipes_producing(self, item: Item) -> List[Recipe]:
+        return self.recipes_by_product.get(item.classname, [])
+
+
+class Progression:
+
+    def __init__(self, world: World) -> None:
+        self.world = world
+        self.closure = {}
+        self.effective_tier = {}
+        self.unlocks = {}
+        in_schematic = set()
+        for schematic in world.schematics:
+            closure = {schematic.classname}
+            tier = schematic.tier
+            recipes = {x.classname for x in schematic.recipes}
+            for required in schematic.required:
+                if required.classname not in self.closure:
+                    raise MyCustomError(
+                        f'Schematic {schematic.name} is listed before its '
+                        f'requirement {required.name}.')
+                closure |= self.closure[required.classname]
+                tier = max(tier, self.effective_tier[required.classname])
+                recipes |= self.unlocks[required.classname]
+            self.closure[schematic.classname] = frozenset(closure)
+            self.effective_tier[schematic.classname] = tier
+            self.unlocks[schematic.classname] = frozenset(recipes)
+            in_schematic.update(x.classname for x in schematic.recipes)
+        self.always_available = frozenset(
+            x.classname for x in world.recipes
+            if x.classname not in in_schematic)
+        self.all_recipes = frozenset(x.classname for x in world.recipes)
+
+        self.max_tier = max(self.effective_tier.values(), default=0)
+        by_tier = [set() for _ in range(self.max_tier + 1)]
+        for schematic in world.schematics:
+            by_tier[self.effective_tier[schematic.classname]].update(
+                x.classname for x in schematic.recipes)
+        self.by_tier = []
+        cumulative = set(self.always_available)
+        for recipes in by_tier:
+            cumulative |= recipes
+            self.by_tier.append(frozenset(cumulative))
+        self._cache = {}
+
+    def _schematic_classnames(self, schematics: Iterable) -> frozenset:
+        classnames = set()
+        for schematic in schematics:
+            classname = getattr(schematic, 'classname', schematic)
+            if classname not in self.closure:
+                raise MyCustomError(f'Unknown schematic {classname}.')
+            classnames.add(classname)
+        return frozenset(classnames)
+
+    def available(self, tier: int=None,
+                  schematics: Iterable=None) -> frozenset:
+        """ Classnames of the recipes unlocked by every schematic up to tier
+        (counting the tiers of its requirements) and by the given schematics
+        (Schematics or classnames) with their requirements. With neither,
+        every recipe is available.
+        """
+        return self.unlocked(tier, schematics).available
+
+    def unlocked(self, tier: int=None, schematics: Iterable=None) -> Unlocked:
+        """ Cached Unlocked view for tier and/or schematics. """
+        if schematics is not None:
+            schematics = self._schematic_classnames(schematics)
+        if tier is not None:
+            tier = min(max(tier, -1), self.max_tier)
+        key = (tier, schematics)
+        unlocked = self._cache.get(key)
+        if unlocked is None:
+            unlocked = Unlocked(self.world, self._available(tier, schematics))
+            self._cache[key] = unlocked
+        return unlocked
+
+    def _available(self, tier: int, schematics: frozenset) -> frozenset:
+        if tier is None and schematics is None:
+            return self.all_recipes
+        available = self.always_available
+        if tier is not None and tier >= 0:
+            available = self.by_tier[tier]
+        if schematics:
+            available = available.union(
+                *(self.unlocks[x] for x in schematics))
+        return available
+
+    def selection(self, tier: int=None,
+                  schematics: Iterable=None) -> Dict[str, Recipe]:
+        return self.unlocked(tier, schematics).selection
+
+    def recipes(self, tier: int=None,
+                schematics: Iterable=None) -> List[Recipe]:
+        """ Available recipes in dataset order, e.g. for Optimizer. """
+        return self.unlocked(tier, schematics).recipes
+
+    def policy(self, tier: int=None, schematics: Iterable=None,
+               prefer_alternates: bool=False,
+               overrides: dict=None) -> RecipePolicy:
+        """ RecipePolicy restricted to the available recipes, for
+        World.bind_default_recipes.
+        """
+        return RecipePolicy(prefer_alternates, overrides,
+                            self.available(tier, schematics))
@@ -0,0 +1,316 @@
+""" Several datasets (game patches, modded dumps) loaded side by side.
+
+Every object gets a content key: its own fields plus the classnames of the
+objects it refers to. An object of a new version is replaced by the equal
+object of an earlier version only when everything it refers to is replaced
+too, and by exactly the objects that earlier object refers to. That set is
+found as a fixpoint: start from every object with a known key and drop
+objects referring to one that was dropped until nothing changes. So a
+changed recipe keeps its own new object, as do the schematics unlocking it
+(and, through their requirements, the schematics after those), and a
+changed item the recipes using it; all the rest is shared.
+
+The default recipe of an item is not part of its identity, as it refers to
+a recipe and recipes refer to items, which would unshare everything
+downstream of a single change. A shared item keeps the default recipe of
+the version that first loaded it; where a version chose differently, the
+choice is kept per version and applied by its WorldView.
+
+Shared objects belong to several worlds at once and must not be changed.
+Sessions get a WorldView, which overrides recipe choices without touching
+the items.
+"""
+from __future__ import annotations
+
+from collections import OrderedDict
+from typing import Dict, List
+
+from world import Startup, World, Item, ItemAmount, Recipe
+from error_handler import MyCustomError
+from graph import ProductionGraph
+
+KINDS = ('items', 'buildings', 'recipes', 'schematics')
+
+
+def _amounts(item_amounts: List[ItemAmount]) -> tuple:
+    return tuple((x.item.classname, x.amount) for x in item_amounts)
+
+
+def content_key(kind: str, obj) -> tuple:
+    """ Fields of obj with references given by classname. The default
+    recipe of an item is left out (see the module docstring).
+    """
+    if kind == 'items':
+        return (obj.classname, obj.name, obj.slug, obj.stack_size,
+                obj.liquid, obj.sink_points, obj.energy_value)
+    if kind == 'buildings':
+        return (obj.classname, obj.name, obj.slug, obj.description,
+                obj.power_consumption, obj.input_qty, obj.output_qty,
+                obj.power_consumption_exponent, obj.manufacturing_speed)
+    if kind == 'recipes':
+        return (obj.classname, obj.name, obj.slug, obj.is_alternate,
+                obj.time, _amounts(obj.ingredients), _amounts(obj.products),
+                tuple(x.classname for x in obj.buildings))
+    if kind == 'schematics':
+        return (obj.classname, obj.name, obj.slug, obj.tier, obj.type,
+                tuple(x.classname for x in obj.required),
+                tuple(x.classname for x in obj.recipes))
+    raise MyCustomError(f'Unknown kind {kind}.')
+
+
+def version_key(kind: str, obj) -> tuple:
+    """ content_key plus the default recipe of items, to compare versions.
+    """
+    if kind == 'items':
+        recipe = obj.default_recipe
+        return content_key(kind, obj) + (
+            recipe.classname if recipe is not None else None,)
+    return content_key(kind, obj)
+
+
+def references(kind: str, obj) -> list:
+    """ Objects obj refers to, in content_key order. """
+    if kind == 'recipes':
+        return ([x.item for x in obj.ingredients]
+                + [x.item for x in obj.products] + list(obj.buildings))
+    if kind == 'schematics':
+        return list(obj.required) + list(obj.recipes)
+    return []
+
+
+class WorldDiff:
+    """ Classnames added, removed and changed between two versions, per
+    kind.
+    """
+
+    def __init__(self, added: Dict[str, list], removed: Dict[str, list],
+                 changed: Dict[str, list]) -> None:
+        self.added = added
+        self.removed = removed
+        self.changed = changed
+
+    def __bool__(self) -> bool:
+        return (any(self.added.values()) or any(self.removed.values())
+                or any(self.changed.values()))
+
+    def to_dict(self) -> dict:
+        return {'added': self.added, 'removed': self.removed,
+                'changed': self.changed}
+
+
+class WorldView:
+    """ Read-only view of a World with per-session recipe choices.
+    overrides maps item classnames to recipe classnames (None makes the
+    item raw) and wins over defaults, the recipes (by item classname) the
+    world's version uses instead of the default recipes of shared items,
+    which win over the items' default recipes. Attribute reads go to the
+    world; views are cheap, so changing overrides makes a new one.
+    """
+
+    __slots__ = ('world', 'overrides', 'defaults', 'selection')
+
+    def __init__(self, world: World, overrides: dict=None,
+                 defaults: dict=None) -> None:
+        selection = dict(defaults or {})
+        for item_classname, recipe_classname in (overrides or {}).items():
+            item = world.find_item(item_classname)
+            if item is None:
+                raise MyCustomError(f'Unknown item {item_classname}.')
+            recipe = None
+            if recipe_classname is not None:
+                recipe = world.get_recipe(recipe_classname)
+                if recipe is None:
+                    raise MyCustomError(
+                        f'Unknown recipe {recipe_classname}.')
+                ProductionGraph.amount_produced(recipe, item)
+            selection[item.classname] = recipe
+        object.__setattr__(self, 'world', world)
+        object.__setattr__(self, 'overrides', dict(overrides or {}))
+        object.__setattr__(self, 'defaults', dict(defaults or {}))
+        object.__setattr__(self, 'selection', selection)
+
+    def __getattr__(self, name: str):
+        if name == 'bind_default_recipes':
+            raise MyCustomError('Items of a registry world are shared; '
+                                'use WorldView.with_overrides instead.')
+        return getattr(self.world, name)
+
+    def __setattr__(self, name: str, value) -> None:
+        raise MyCustomError('WorldView is read-only.')
+
+    def with_overrides(self, overrides: dict) -> WorldView:
+        """ New view with overrides added to (or replacing) these. """
+        merged = dict(self.overrides)
+        merged.update(overrides)
+        return WorldView(self.world, merged, self.defaults)
+
+    def recipe_for(self, item: Item) -> Recipe:
+        return ProductionGraph.recipe_for(item, self.selection)
+
+    def build_graph(self, item_amounts: List[ItemAmount],
+                    exact: bool=False) -> ProductionGraph:
+        return ProductionGraph.build(item_amounts, exact, self.selection)
+
+
+class WorldRegistry:
+
+    def __init__(self) -> None:
+        self.worlds = OrderedDict()
+        self._keys = {}
+        self._defaults = {}
+        self._pool = {kind: {} for kind in KINDS}
+
+    def load(self, version: str, file_dir: str=None,
+             world: World=None) -> World:
+        """ Registers the dataset at file_dir (or an already built world) as
+        version, sharing every object that is unchanged since a registered
+        version.
+        """
+        if version in self.worlds:
+            raise MyCustomError(f'Version {version} is already loaded.')
+        if world is None:
+            world = Startup.build_world(version, file_dir)
+        keys = {kind: {id(obj): content_key(kind, obj)
+                       for obj in getattr(world, kind)} for kind in KINDS}
+        self._keys[version] = {
+            kind: {obj.classname: version_key(kind, obj)
+                   for obj in getattr(world, kind)} for kind in KINDS}
+        replacement = self._shared(world, keys)
+        world, defaults = self._rebuild(version, world, replacement)
+        self.worlds[version] = world
+        self._defaults[version] = defaults
+        for kind in KINDS:
+            for obj in getattr(world, kind):
+                self._pool[kind].setdefault(content_key(kind, obj), obj)
+        return world
+
+    def _shared(self, world: World, keys: dict) -> dict:
+        """ Maps id of each replaceable object to its registered twin. """
+        replacement = {}
+        objects = {}
+        for kind in KINDS:
+            for obj in getattr(world, kind):
+                twin = self._pool[kind].get(keys[kind][id(obj)])
+                if twin is not None:
+                    replacement[id(obj)] = twin
+                    objects[id(obj)] = (kind, obj)
+        changed = True
+        while changed:
+            changed = False
+            for object_id in list(replacement):
+                kind, obj = objects[object_id]
+                twin = replacement[object_id]
+                for ref, twin_ref in zip(references(kind, obj),
+                                         references(kind, twin)):
+                    if replacement.get(id(ref)) is not twin_ref:
+                        del replacement[object_id]
+                        changed = True
+                        break
+        return replacement
+
+    @staticmethod
+    def _rebuild(version: str, world: World, replacement: dict) -> tuple:
+        """ Swaps shared objects in and points the new ones at them.
+        Returns the world and the recipes (by item classname) it uses
+        instead of the default recipes of the shared items.
+        """
+        def swap(obj):
+            return replacement.get(id(obj), obj)
+
+        for recipe in world.recipes:
+            if id(recipe) in replacement:
+                continue
+            recipe.ingredients = [ItemAmount(swap(x.item), x.amount)
+                                  for x in recipe.ingredients]
+            recipe.products = [ItemAmount(swap(x.item), x.amount)
+                               for x in recipe.products]
+            recipe.buildings = [swap(x) for x in recipe.buildings]
+        defaults = {}
+        for item in world.items:
+            recipe = swap(item.default_recipe)
+            if id(item) not in replacement:
+                item.default_recipe = recipe
+            elif swap(item).default_recipe is not recipe:
+                defaults[item.classname] = recipe
+        for schematic in world.schematics:
+            if id(schematic) not in replacement:
+                schematic.required = [swap(x) for x in schematic.required]
+                schematic.recipes = [swap(x) for x in schematic.recipes]
+        for resource in world.resources:
+            resource.item = swap(resource.item)
+        for miner in world.miners:
+            miner.building = swap(miner.building)
+            miner.allowed_resources = [swap(x)
+                                       for x in miner.allowed_resources]
+        for generator in world.generators:
+            generator.building = swap(generator.building)
+            for fuel in generator.fuels:
+                fuel.item = swap(fuel.item)
+                fuel.supplemental_item = swap(fuel.supplemental_item)
+                fuel.byproduct = swap(fuel.byproduct)
+        return World(name = version,
+                     recipes = [swap(x) for x in world.recipes],
+                     items = [swap(x) for x in world.items],
+                     buildings = [swap(x) for x in world.buildings],
+                     schematics = [swap(x) for x in world.schematics],
+                     resources = world.resources, miners = world.miners,
+                     generators = world.generators), defaults
+
+    def get(self, version: str) -> World:
+        """ The world of version. Its shared items keep the default recipes
+        of the version that first loaded them; plan through view(), which
+        applies the version's own choices.
+        """
+
+        if version not in self.worlds:
+            raise MyCustomError(f'Version {version} is not loaded.')
+        return self.worlds[version]
+
+    def view(self, version: str, overrides: dict=None) -> WorldView:
+        return WorldView(self.get(version), overrides,
+                         self._defaults[version])
+
+    def unload(self, version: str) -> None:
+        """ Drops version; its objects stay only while other versions use
+        them.
+        """
+        self.get(version)
+        del self.worlds[version]
+        del self._keys[version]
+        del self._defaults[version]
+        self._pool = {kind: {} for kind in KINDS}
+        for world in self.worlds.values():
+            for kind in KINDS:
+                for obj in getattr(world, kind):
+                    self._pool[kind].setdefault(content_key(kind, obj), obj)
+
+    def sharing(self, version: str) -> Dict[str, tuple]:
+        """ (objects shared with other versions, objects) per kind. """
+        world = self.get(version)
+        others = {kind: set() for kind in KINDS}
+        for name, other in self.worlds.items():
+            if name != version:
+                for kind in KINDS:
+                    others[kind].update(id(x) for x in getattr(other, kind))
+        return {kind: (sum(1 for x in getattr(world, kind)
+                           if id(x) in others[kind]),
+                       len(getattr(world, kind)))
+                for kind in KINDS}
+
+    def diff(self, old: str, new: str) -> WorldDiff:
+        """ What changed from version old to version new, by classname.
+        Changes include fields and references (e.g. a recipe whose
+        ingredients differ, or an item with another default recipe).
+        """
+        self.get(old)
+        self.get(new)
+        added, removed, changed = {}, {}, {}
+        for kind in KINDS:
+            old_keys = self._keys[old][kind]
+            new_keys = self._keys[new][kind]
+            added[kind] = sorted(set(new_keys) - set(old_keys))
+            removed[kind] = sorted(set(old_keys) - set(new_keys))
+            changed[kind] = sorted(
+                x for x in set(old_keys) & set(new_keys)
+                if old_keys[x] != new_keys[x])
+        return WorldDiff(added, removed, changed)
@@ -0,0 +1,157 @@
+""" Diagram output without the diagrams package or Graphviz.
+
+Trees are first collapsed into a ProductionGraph so every (item, recipe)
+pair is drawn once with its summed rate and machine count. The graph can
+then be written as DOT text (for Graphviz, when it is available), as a JSON
+layout or as a plain SVG laid out in layers here.
+"""
+from __future__ import annotations
+
+import json
+from concurrent.futures import Future, ThreadPoolExecutor
+from html import escape
+from typing import Dict, List
+
+import instrumentation
+from error_handler import MyCustomError
+from graph import ProductionGraph, GraphNode
+from tree import Tree
+
+NODE_WIDTH = 220
+NODE_HEIGHT = 44
+H_SPACING = 40
+V_SPACING = 70
+
+_executor = None
+
+
+def collapse(tree: Tree) -> ProductionGraph:
+    return ProductionGraph.from_tree(tree)
+
+
+class GraphRenderer:
+
+    def __init__(self, graph: ProductionGraph) -> None:
+        self.graph = graph
+
+    @staticmethod
+    def from_tree(tree: Tree) -> GraphRenderer:
+        return GraphRenderer(collapse(tree))
+
+    @staticmethod
+    def label(node: GraphNode) -> str:
+        text = f'{float(node.amount):.4g} {node.item.name}'
+        for building, machines in node.machines.items():
+            text += f'\n{float(machines):.3g} x {building.name}'
+        return text
+
+    def layers(self) -> List[int]:
+        """ Layer of every node: targets on layer 0 and each producer one
+        layer below its deepest consumer.
+        """
+        consumers = {node.index: 0 for node in self.graph.nodes}
+        producers = {node.index: [] for node in self.graph.nodes}
+        for edge in self.graph.edges:
+            consumers[edge.producer] += 1
+            producers[edge.consumer].append(edge.producer)
+        layer = [0]*len(self.graph.nodes)
+        ready = [index for index, count in consumers.items() if count == 0]
+        while ready:
+            index = ready.pop()
+            for producer in producers[index]:
+                layer[producer] = max(layer[producer], layer[index] + 1)
+                consumers[producer] -= 1
+                if consumers[producer] == 0:
+                    ready.append(producer)
+        if any(consumers.values()):
+            raise MyCustomError('Only acyclic graphs can be laid out.')
+        return layer
+
+    def layout(self) -> Dict[str, list]:
+        """ Node positions by layer, with targets at the top. """
+        layer = self.layers()
+        row_size = {}
+        nodes = []
+        for node in self.graph.nodes:
+            column = row_size.get(layer[node.index], 0)
+            row_size[layer[node.index]] = column + 1
+            nodes.append({
+                'id': node.index,
+                'item': node.item.classname,
+                'recipe': node.recipe.classname if node.recipe else None,
+                'label': GraphRenderer.label(node),
+                'layer': layer[node.index],
+                'x': column*(NODE_WIDTH + H_SPACING),
+                'y': layer[node.index]*(NODE_HEIGHT + V_SPACING),
+                })
+        edges = [{'source': edge.producer, 'target': edge.consumer,
+                  'flow': float(edge.flow)} for edge in self.graph.edges]
+        return {'nodes': nodes, 'edges': edges}
+
+    def to_dot(self) -> str:
+        lines = ['digraph production {', '  rankdir=BT;',
+                 '  node [shape=box];']
+        for node in self.graph.nodes:
+            label = GraphRenderer.label(node).replace('"', '\\"')
+            label = label.replace('\n', '\\n')
+            lines.append(f'  n{node.index} [label="{label}"];')
+        for edge in self.graph.edges:
+            lines.append(f'  n{edge.producer} -> n{edge.consumer} '
+                         f'[label="{float(edge.flow):.4g}"];')
+        lines.append('}')
+        return '\n'.join(lines) + '\n'
+
+    def to_json(self) -> str:
+        return json.dumps(self.layout())
+
+    def to_svg(self) -> str:
+        layout = self.layout()
+        positions = {x['id']: x for x in layout['nodes']}
+        width = max([x['x'] for x in layout['nodes']] + [0]) + NODE_WIDTH
+        height = max([x['y'] for x in layout['nodes']] + [0]) + NODE_HEIGHT
+        parts = [f'<svg xmlns="http://www.w3.org/2000/svg" '
+                 f'width="{width}" height="{height}" font-size="11" '
+                 'font-family="sans-serif">']
+        for edge in layout['edges']:
+            source = positions[edge['source']]
+            target = positions[edge['target']]
+            parts.append(
+                f'<line x1="{source["x"] + NODE_WIDTH//2}" '
+                f'y1="{source["y"]}" x2="{target["x"] + NODE_WIDTH//2}" '
+                f'y2="{target["y"] + NODE_HEIGHT}" stroke="#888"/>')
+        for node in layout['nodes']:
+            parts.append(
+                f'<rect x="{node["x"]}" y="{node["y"]}" '
+                f'width="{NODE_WIDTH}" height="{NODE_HEIGHT}" '
+                'fill="#f4f4f4" stroke="#333"/>')
+            for line_number, line in enumerate(node['label'].split('\n')):
+                parts.append(
+                    f'<text x="{node["x"] + 6}" '
+                    f'y="{node["y"] + 16 + 14*line_number}">'
+                    f'{escape(line)}</text>')
+        parts.append('</svg>')
+        return '\n'.join(parts) + '\n'
+
+    def render(self, path: str) -> str:
+        """ Writes the graph to path as .dot, .json or .svg. """
+        writers = {'dot': self.to_dot, 'gv': self.to_dot,
+                   'json': self.to_json, 'svg': self.to_svg}
+        extension = path.rsplit('.', 1)[-1].lower()
+        if extension not in writers:
+            raise MyCustomError(
+                f'Unknown diagram format {extension}, use one of '
+                f'{sorted(writers)}.')
+        with instrumentation.timer(f'render.{extension}'):
+            text = writers[extension]()
+            with open(path, 'w', encoding='utf-8') as diagram_file:
+                diagram_file.write(text)
+        instrumentation.count('render.nodes', len(self.graph.nodes))
+        return path
+
+    def render_async(self, path: str) -> Future:
+        """ Renders on a background thread; the future returns the path. """
+        global _executor
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=1,
+                                           thread_name_prefix='render')
+        return _executor.submit(self.render, path)
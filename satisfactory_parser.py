@@ -1,8 +1,15 @@
 import json
+import os
 
-file_dir = 'C:/Users/mauri/OneDrive/Documentos/Estudos/Python/Satisfactory/source/data.json'
+default_file_dir = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'source', 'data.json')
+file_dir = os.environ.get('SATISFACTORY_DATA', default_file_dir)
 keys = ['buildings', 'generators', 'items', 'miners', 'recipes', 'resources', 'schematics']
 
+# Parsed datasets keyed by absolute path. Each entry holds the file
+# signature (mtime, size) it was parsed from and the decoded data.
+_cache = {}
+
 
 def parse_file(file_dir):
     parsed_data=''
@@ -10,22 +17,72 @@ def parse_file(file_dir):
         parsed_data = json.load(json_data)
     return parsed_data
 
-def get_items():
-    return parse_file(file_dir)["items"]
+def set_file_dir(new_file_dir: str) -> None:
+    """ Changes the dataset used when no path is given to the loaders. """
+    global file_dir
+    file_dir = new_file_dir
+
+def get_file_dir() -> str:
+    return file_dir
+
+def _file_signature(path: str) -> tuple:
+    stat = os.stat(path)
+    return (stat.st_mtime_ns, stat.st_size)
+
+def load_dataset(path: str=None) -> dict:
+    """ Returns the parsed dataset, reading the file only when it was not
+    parsed yet or when its mtime or size changed since the last parse.
+    The returned dict is shared between callers and must not be modified.
+    """
+    path = os.path.abspath(path or file_dir)
+    signature = _file_signature(path)
+    cached = _cache.get(path)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+    parsed_data = parse_file(path)
+    _cache[path] = (signature, parsed_data)
+    return parsed_data
+
+def invalidate(path: str=None) -> None:
+    """ Drops the cached dataset for path, or every cached dataset when no
+    path is given.
+    """
+    if path is None:
+        _cache.clear()
+    else:
+        _cache.pop(os.path.abspath(path), None)
+
+def reload(path: str=None) -> dict:
+    """ Forces a new parse of the dataset. """
+    invalidate(path or file_dir)
+    return load_dataset(path)
+
+def get_items(path: str=None):
+    return load_dataset(path)["items"]
+
+def get_buildings(path: str=None):
+    return load_dataset(path)["buildings"]
+
+def get_recipes(path: str=None):
+    return load_dataset(path)["recipes"]
+
+def get_schematics(path: str=None):
+    return load_dataset(path)["schematics"]
 
-def get_buildings():
-    return parse_file(file_dir)["buildings"]
+def get_resources(path: str=None):
+    return load_dataset(path)["resources"]
 
-def get_recipes():
-    return parse_file(file_dir)["recipes"]
+def get_miners(path: str=None):
+    return load_dataset(path)["miners"]
 
+def get_generators(path: str=None):
+    return load_dataset(path)["generators"]
 
-a = get_items()
 
 # =============================================================================
 # a=get_itens()
-# 
-# 
+#
+#
 # for key, value in a.items():
 #     print(value["name"])
 #     print('################')
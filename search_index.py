@@ -0,0 +1,193 @@
+""" Prebuilt search over the items, recipes and buildings of a World.
+
+Names, slugs and classNames are split into tokens. Every prefix of a name
+token is indexed, so autocomplete queries are dictionary lookups, and the
+deletion variants of name tokens (SymSpell style) give typo tolerance
+without scanning. Building descriptions are indexed by whole token only and
+weigh less than names.
+"""
+from __future__ import annotations
+
+import heapq
+import re
+from typing import Dict, List, Tuple
+
+from world import World
+
+# classname parts that carry no meaning for a search
+NOISE_TOKENS = frozenset(['desc', 'recipe', 'build', 'bp', 'c', 'eq',
+                          'alternate'])
+MIN_FUZZY_LENGTH = 3
+TWO_TYPOS_LENGTH = 8
+TOKEN_CACHE_SIZE = 4096
+
+EXACT_NAME = 100
+NAME_PREFIX = 40
+TOKEN = 3
+TOKEN_PREFIX = 2
+TYPO = 1
+DESCRIPTION = 0.5
+
+_words = re.compile(r'[a-z0-9]+')
+_camel = re.compile(r'[A-Z]+(?![a-z])|[A-Z]?[a-z]+|[0-9]+')
+
+
+def tokenize(text: str) -> List[str]:
+    return _words.findall(text.lower()) if text else []
+
+
+def classname_tokens(classname: str) -> List[str]:
+    return [x.lower() for x in _camel.findall(classname)
+            if x.lower() not in NOISE_TOKENS]
+
+
+def deletes(token: str, distance: int) -> set:
+    """ Variants of token with up to distance characters removed. """
+    variants = set()
+    level = {token}
+    for _ in range(distance):
+        level = {x[:i] + x[i + 1:] for x in level for i in range(len(x))
+                 if len(x) > 2}
+        variants |= level
+    return variants
+
+
+def max_typos(token: str) -> int:
+    if len(token) >= TWO_TYPOS_LENGTH:
+        return 2
+    if len(token) >= MIN_FUZZY_LENGTH:
+        return 1
+    return 0
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """ Optimal string alignment distance, stopping early above limit. """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0]*len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1,
+                             previous[j - 1] + cost)
+            if (previous2 is not None and i > 1 and j > 1
+                    and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]):
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+class SearchIndex:
+
+    def __init__(self, world: World) -> None:
+        self.entries = []
+        self.kinds = []
+        self.names = []
+        self.exact = {}
+        self.tokens = {}
+        self.prefixes = {}
+        self.description_tokens = {}
+        self.typos = {}
+        self._token_cache = {}
+        for kind, objects in (('item', world.items),
+                              ('recipe', world.recipes),
+                              ('building', world.buildings)):
+            for obj in objects:
+                self._add(kind, obj)
+
+    def _add(self, kind: str, obj: object) -> None:
+        entry = len(self.entries)
+        self.entries.append(obj)
+        self.kinds.append(kind)
+        name = obj.name.lower()
+        self.names.append(name)
+        for key in {name, obj.slug, obj.classname.lower()}:
+            self.exact.setdefault(key, []).append(entry)
+        name_tokens = set(tokenize(obj.name) + tokenize(obj.slug)
+                          + classname_tokens(obj.classname))
+        for token in name_tokens:
+            self.tokens.setdefault(token, set()).add(entry)
+            for end in range(1, len(token) + 1):
+                self.prefixes.setdefault(token[:end], set()).add(entry)
+            for variant in deletes(token, max_typos(token)) | {token}:
+                self.typos.setdefault(variant, set()).add(token)
+        description = getattr(obj, 'description', None)
+        for token in set(tokenize(description)) - name_tokens:
+            self.description_tokens.setdefault(token, set()).add(entry)
+
+    def _match_token(self, token: str, is_prefix: bool) -> Dict[int, float]:
+        """ Score of every entry matching one query token. Results are kept,
+        as typing a query repeats the same tokens many times.
+        """
+        key = (token, is_prefix)
+        scores = self._token_cache.get(key)
+        if scores is None:
+            if len(self._token_cache) >= TOKEN_CACHE_SIZE:
+                self._token_cache.clear()
+            scores = self._token_cache[key] = self._score_token(token,
+                                                                is_prefix)
+        return scores
+
+    def _score_token(self, token: str, is_prefix: bool) -> Dict[int, float]:
+        scores = {}
+        if len(token) >= MIN_FUZZY_LENGTH:
+            limit = max_typos(token)
+            candidates = set()
+            for variant in deletes(token, limit) | {token}:
+                candidates.update(self.typos.get(variant, ()))
+            for candidate in candidates:
+                if edit_distance(token, candidate, limit) <= limit:
+                    for entry in self.tokens[candidate]:
+                        scores[entry] = TYPO
+        for entry in self.description_tokens.get(token, ()):
+            scores[entry] = max(scores.get(entry, 0), DESCRIPTION)
+        if is_prefix:
+            for entry in self.prefixes.get(token, ()):
+                scores[entry] = max(scores.get(entry, 0), TOKEN_PREFIX)
+        for entry in self.tokens.get(token, ()):
+            scores[entry] = TOKEN
+        return scores
+
+    def search_scored(self, query: str, kinds: Tuple[str]=None,
+                      limit: int=10) -> List[Tuple[float, str, object]]:
+        """ (score, kind, object) for the best matches of query. Every query
+        token must match a name token, its prefix (last token only, unless
+        the query ends with a space), a token within the typo budget or a
+        description word.
+        """
+        text = query.lower().strip()
+        query_tokens = tokenize(text)
+        open_prefix = not query.endswith(' ')
+        scores = None
+        for position, token in enumerate(query_tokens):
+            is_prefix = open_prefix and position == len(query_tokens) - 1
+            matches = self._match_token(token, is_prefix)
+            if scores is None:
+                scores = dict(matches)
+            else:
+                scores = {entry: score + matches[entry]
+                          for entry, score in scores.items()
+                          if entry in matches}
+            if not scores:
+                break
+        scores = scores or {}
+        for entry in self.exact.get(text, ()):
+            scores[entry] = scores.get(entry, 0) + EXACT_NAME
+        ranked = []
+        for entry, score in scores.items():
+            if kinds is not None and self.kinds[entry] not in kinds:
+                continue
+            if self.names[entry].startswith(text):
+                score += NAME_PREFIX
+            ranked.append((-score, len(self.names[entry]), entry))
+        return [(-score, self.kinds[entry], self.entries[entry])
+                for score, _, entry in heapq.nsmallest(limit, ranked)]
+
+    def search(self, query: str, kinds: Tuple[str]=None,
+               limit: int=10) -> List[object]:
+        """ Best matching items, recipes or buildings, best first. """
+        return [obj for _, _, obj in self.search_scored(query, kinds, limit)]
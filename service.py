@@ -0,0 +1,306 @@
+""" Planning service: JSON requests over local HTTP or stdin.
+
+A request names its targets and, optionally, the recipe configuration:
+
+    {"targets": [{"item": "Fused Modular Frame", "amount": 3}],
+     "recipes": {"Desc_IronPlate_C": "Recipe_Alternate_CoatedIronPlate_C"},
+     "tier": 4, "overclock": 1.0}
+
+Items are found by className, slug or name and amounts are rates per minute.
+Requests are canonicalized (items resolved to classnames, repeated targets
+summed, everything sorted) so equal requests share one LRU cache entry, and
+a request equal to one still being solved waits for it instead of solving
+again. Solves run in an executor, threads by default or processes that load
+the snapshot like parallel.ParallelPlanner.
+
+    python service.py --http 8080      POST /plan, GET /health
+    python service.py --stdin          one JSON request per line
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import math
+import sys
+from collections import OrderedDict
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Dict
+
+import parallel
+import snapshot
+from world import Startup, World, ItemAmount
+from error_handler import MyCustomError
+from graph import ProductionGraph
+from planner import RatePlanner
+
+MAX_BODY = 1 << 20
+
+
+def _finite(value, what: str) -> float:
+    """ value as a finite float; rejects nan, infinities and overflow. """
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise MyCustomError(f'{what} must be a number.') from None
+    if not math.isfinite(number):
+        raise MyCustomError(f'{what} must be finite.')
+    return number
+
+
+def canonical_request(world: World, request: dict) -> tuple:
+    """ Hashable form of a request: ((item, rate) sorted, (item, recipe)
+    overrides sorted, tier, overclock).
+    """
+    if not isinstance(request, dict) or not request.get('targets'):
+        raise MyCustomError('A request needs a non-empty "targets" list.')
+    targets = {}
+    for target in request['targets']:
+        item = world.find_item(str(target.get('item', '')))
+        if item is None:
+            raise MyCustomError(f'Unknown item {target.get("item")!r}.')
+        amount = _finite(target.get('amount', 1), f'Amount of {item.name}')
+        if amount <= 0:
+            raise MyCustomError(f'Amount of {item.name} must be positive.')
+        targets[item.classname] = _finite(
+            targets.get(item.classname, 0) + amount, f'Amount of {item.name}')
+    recipes = []
+    for item_key, recipe_key in (request.get('recipes') or {}).items():
+        item = world.find_item(item_key)
+        if item is None:
+            raise MyCustomError(f'Unknown item {item_key!r}.')
+        if recipe_key is not None and world.get_recipe(recipe_key) is None:
+            raise MyCustomError(f'Unknown recipe {recipe_key!r}.')
+        recipes.append((item.classname, recipe_key))
+    tier = request.get('tier')
+    if tier is not None and (isinstance(tier, bool)
+                             or not isinstance(tier, int)):
+        raise MyCustomError('Tier must be an integer.')
+    overclock = _finite(request.get('overclock', 1.0), 'Overclock')
+    return (tuple(sorted(targets.items())), tuple(sorted(recipes)),
+            tier, overclock)
+
+
+def solve(world: World, key: tuple) -> dict:
+    """ Plans a canonical request. """
+    targets, recipes, tier, overclock = key
+    selection = {}
+    if tier is not None:
+        selection.update(world.progression().selection(tier))
+    selection.update(parallel.resolve_selection(world, dict(recipes)))
+    item_amounts = [ItemAmount(world.get_item(classname), amount)
+                    for classname, amount in targets]
+    graph = ProductionGraph.build(item_amounts, selection=selection)
+    plan = RatePlanner.plan_graph(graph, overclock)
+    nodes = []
+    raw = {}
+    for node in graph.nodes:
+        if node.recipe is None:
+            raw[node.item.classname] = (raw.get(node.item.classname, 0)
+                                        + float(node.amount))
+            continue
+        nodes.append({
+            'item': node.item.classname,
+            'recipe': node.recipe.classname,
+            'building': node.building.name if node.building else None,
+            'amount': float(node.amount),
+            'machines': float(plan.machines[node.index]),
+            'whole_machines': int(plan.whole_machines[node.index]),
+            'power': float(plan.power[node.index]),
+            })
+    return {'targets': [{'item': x, 'amount': y} for x, y in targets],
+            'nodes': nodes, 'raw': raw, 'power': plan.total_power}
+
+
+def _solve_in_worker(key: tuple) -> dict:
+    return solve(parallel._world, key)
+
+
+class PlanningService:
+
+    def __init__(self, world: World=None, executor: Executor=None,
+                 cache_size: int=256, processes: int=0,
+                 file_dir: str=None) -> None:
+        """ processes > 0 starts a process pool whose workers load the
+        snapshot of the dataset; otherwise solves run on executor (the
+        event loop's default thread pool when None).
+        """
+        self.world = (world if world is not None
+                      else Startup.setup_world('service', file_dir))
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.in_flight = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.executor = executor
+        self._owns_executor = False
+        if processes:
+            path = snapshot.ensure(self.world, file_dir)
+            self.executor = ProcessPoolExecutor(
+                processes, initializer=parallel._init_worker,
+                initargs=(path, {}))
+            self._owns_executor = True
+
+    def close(self) -> None:
+        if self._owns_executor:
+            self.executor.shutdown()
+
+    async def plan(self, request: dict) -> dict:
+        """ Answers a request from the cache, by joining an equal request in
+        flight or by solving it in the executor. The solve runs as a task
+        of its own that every caller awaits through shield, so cancelling
+        one caller leaves the others (and the cache entry) unaffected.
+        """
+        key = canonical_request(self.world, request)
+        if key in self.cache:
+            self.hits += 1
+            self.cache.move_to_end(key)
+            return self.cache[key]
+        task = self.in_flight.get(key)
+        if task is None:
+            self.misses += 1
+            task = asyncio.ensure_future(self._solve(key))
+            # retrieved here so an error nobody else awaited is not logged
+            task.add_done_callback(
+                lambda done: done.cancelled() or done.exception())
+            self.in_flight[key] = task
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    async def _solve(self, key: tuple) -> dict:
+        loop = asyncio.get_running_loop()
+        try:
+            if self._owns_executor:
+                result = await loop.run_in_executor(
+                    self.executor, _solve_in_worker, key)
+            else:
+                result = await loop.run_in_executor(
+                    self.executor, solve, self.world, key)
+        finally:
+            del self.in_flight[key]
+        self.cache[key] = result
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return result
+
+    async def handle(self, text: str) -> dict:
+        """ Answers one JSON request text; errors become {"error": ...}. """
+        try:
+            return await self.plan(json.loads(text))
+        except (MyCustomError, ValueError, TypeError,
+                AttributeError) as error:
+            return {'error': str(error)}
+
+    def stats(self) -> Dict[str, int]:
+        return {'hits': self.hits, 'misses': self.misses,
+                'coalesced': self.coalesced, 'cached': len(self.cache),
+                'in_flight': len(self.in_flight)}
+
+    async def _http_connection(self, reader: asyncio.StreamReader,
+                               writer: asyncio.StreamWriter) -> None:
+        try:
+            request_line = (await reader.readline()).decode('latin-1')
+            headers = {}
+            while True:
+                line = (await reader.readline()).decode('latin-1').strip()
+                if not line:
+                    break
+                name, _, value = line.partition(':')
+                headers[name.strip().lower()] = value.strip()
+            method, path = (request_line.split() + ['', ''])[:2]
+            length = int(headers.get('content-length', 0))
+            if length > MAX_BODY:
+                status, body = '413 Payload Too Large', {'error': 'too large'}
+            elif method == 'POST' and path == '/plan':
+                text = (await reader.readexactly(length)).decode('utf-8')
+                body = await self.handle(text)
+                status = '400 Bad Request' if 'error' in body else '200 OK'
+            elif method == 'GET' and path == '/health':
+                status, body = '200 OK', self.stats()
+            else:
+                status, body = '404 Not Found', {'error': 'not found'}
+            payload = json.dumps(body).encode('utf-8')
+            writer.write(
+                f'HTTP/1.1 {status}\r\nContent-Type: application/json\r\n'
+                f'Content-Length: {len(payload)}\r\n'
+                'Connection: close\r\n\r\n'.encode('latin-1') + payload)
+            await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve_http(self, host: str='127.0.0.1',
+                         port: int=8080) -> asyncio.AbstractServer:
+        """ Starts the HTTP server; port 0 picks a free port. """
+        return await asyncio.start_server(self._http_connection, host, port)
+
+    async def serve_stdin(self, input_file=None, output_file=None) -> None:
+        """ Answers one JSON request per input line, one JSON line each, in
+        input order. Every line is handled as soon as it is read, so equal
+        requests on consecutive lines are coalesced.
+        """
+        input_file = input_file or sys.stdin
+        output_file = output_file or sys.stdout
+        loop = asyncio.get_running_loop()
+        pending = asyncio.Queue()
+
+        async def write_answers() -> None:
+            while True:
+                answer = await pending.get()
+                if answer is None:
+                    return
+                output_file.write(json.dumps(await answer) + '\n')
+                output_file.flush()
+
+        writer = asyncio.ensure_future(write_answers())
+        try:
+            while True:
+                line = await loop.run_in_executor(None, input_file.readline)
+                if not line:
+                    break
+                if line.strip():
+                    pending.put_nowait(asyncio.ensure_future(
+                        self.handle(line)))
+        finally:
+            pending.put_nowait(None)
+            await writer
+
+
+async def request_plan(request: dict, host: str='127.0.0.1',
+                       port: int=8080) -> dict:
+    """ Local client: POSTs request to a running service. """
+    reader, writer = await asyncio.open_connection(host, port)
+    body = json.dumps(request).encode('utf-8')
+    writer.write(f'POST /plan HTTP/1.1\r\nHost: {host}\r\n'
+                 'Content-Type: application/json\r\n'
+                 f'Content-Length: {len(body)}\r\n\r\n'.encode('latin-1')
+                 + body)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    return json.loads(response.split(b'\r\n\r\n', 1)[1])
+
+
+async def _main(arguments) -> None:
+    service = PlanningService(processes=arguments.processes)
+    try:
+        if arguments.http is not None:
+            server = await service.serve_http(arguments.host, arguments.http)
+            async with server:
+                await server.serve_forever()
+        else:
+            await service.serve_stdin()
+    finally:
+        service.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--http', type=int, metavar='PORT')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--stdin', action='store_true')
+    parser.add_argument('--processes', type=int, default=0)
+    asyncio.run(_main(parser.parse_args()))
@@ -0,0 +1,251 @@
+""" Compiled snapshots of a bound World.
+
+A snapshot is a small header followed by a marshal payload made only of
+tuples, strings and numbers. Cross references (recipe ingredients, products,
+buildings and item default recipes) are stored as integer positions in the
+items, buildings, recipes and schematics tuples, so loading is a single read
+plus one marshal.loads and a linear pass that rebuilds the objects.
+"""
+from __future__ import annotations
+
+import hashlib
+import marshal
+import mmap
+import os
+import struct
+import sys
+import tempfile
+
+import satisfactory_parser as sp
+from world import (World, Item, ItemAmount, Building, Recipe, Schematic,
+                   Resource, Miner, Fuel, Generator)
+
+MAGIC = b'SFWSNAP'
+FORMAT_VERSION = 4
+# magic, format version, python major/minor, source mtime_ns, source size
+HEADER = struct.Struct('<7sHBBqq')
+SUFFIX = '.snapshot'
+
+
+def default_path(file_dir: str=None) -> str:
+    return os.path.abspath(file_dir or sp.get_file_dir()) + SUFFIX
+
+
+def fallback_path(file_dir: str=None) -> str:
+    """ Snapshot path in the temp directory, for read-only installs. """
+    source = os.path.abspath(file_dir or sp.get_file_dir())
+    digest = hashlib.sha1(source.encode('utf-8')).hexdigest()[:16]
+    return os.path.join(tempfile.gettempdir(),
+                        f'satisfactory-{digest}{SUFFIX}')
+
+
+def _source_signature(file_dir: str) -> tuple:
+    stat = os.stat(file_dir)
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def encode(world: World) -> tuple:
+    """ Flattens a bound world into tuples with integer references. """
+    item_ids = {id(item): i for i, item in enumerate(world.items)}
+    building_ids = {id(building): i
+                    for i, building in enumerate(world.buildings)}
+    recipe_ids = {id(recipe): i for i, recipe in enumerate(world.recipes)}
+    schematic_ids = {id(schematic): i
+                     for i, schematic in enumerate(world.schematics)}
+
+    def encode_amounts(item_amounts):
+        return tuple((item_ids[id(x.item)], x.amount) for x in item_amounts)
+
+    items = tuple(
+        (item.classname, item.name, item.slug, item.stack_size, item.liquid,
+         item.sink_points,
+         recipe_ids.get(id(item.default_recipe), -1), item.energy_value)
+        for item in world.items)
+    buildings = tuple(
+        (building.classname, building.name, building.slug,
+         building.description, building.power_consumption,
+         building.input_qty, building.output_qty,
+         building.power_consumption_exponent, building.manufacturing_speed)
+        for building in world.buildings)
+    recipes = tuple(
+        (recipe.classname, recipe.name, recipe.slug, recipe.is_alternate,
+         recipe.time, encode_amounts(recipe.ingredients),
+         encode_amounts(recipe.products),
+         tuple(building_ids[id(x)] for x in recipe.buildings))
+        for recipe in world.recipes)
+    schematics = tuple(
+        (schematic.classname, schematic.name, schematic.slug, schematic.tier,
+         schematic.type,
+         tuple(schematic_ids[id(x)] for x in schematic.required),
+         tuple(recipe_ids[id(x)] for x in schematic.recipes))
+        for schematic in world.schematics)
+    resources = tuple((item_ids[id(x.item)], x.speed)
+                      for x in world.resources)
+    miners = tuple(
+        (miner.classname, building_ids.get(id(miner.building), -1),
+         tuple(item_ids[id(x)] for x in miner.allowed_resources),
+         miner.items_per_cycle, miner.extract_cycle_time,
+         miner.allow_liquids, miner.allow_solids)
+        for miner in world.miners)
+    generators = tuple(
+        (generator.classname, building_ids.get(id(generator.building), -1),
+         tuple((item_ids[id(x.item)],
+                item_ids.get(id(x.supplemental_item), -1),
+                item_ids.get(id(x.byproduct), -1), x.byproduct_amount)
+               for x in generator.fuels),
+         generator.power_production, generator.power_production_exponent,
+         generator.water_to_power_ratio)
+        for generator in world.generators)
+    return (world.name, items, buildings, recipes, schematics, resources,
+            miners, generators)
+
+
+def decode(payload: tuple, name: str=None) -> World:
+    """ Rebuilds a bound world from encode() output. """
+    (world_name, items_rows, buildings_rows, recipes_rows, schematics_rows,
+     resources_rows, miners_rows, generators_rows) = payload
+    items = [Item(row[0], row[1], row[2], row[3], row[4], row[5],
+                  energy_value = row[7])
+             for row in items_rows]
+    buildings = [Building(*row) for row in buildings_rows]
+    recipes = [
+        Recipe(classname = row[0], name = row[1], slug = row[2],
+               is_alternate = row[3], time = row[4],
+               ingredients = [ItemAmount(items[i], amount)
+                              for i, amount in row[5]],
+               products = [ItemAmount(items[i], amount)
+                           for i, amount in row[6]],
+               produced_in = [buildings[i] for i in row[7]])
+        for row in recipes_rows]
+    for item, row in zip(items, items_rows):
+        if row[6] >= 0:
+            item.default_recipe = recipes[row[6]]
+    # schematics are stored in topological order, requirements first
+    schematics = []
+    for row in schematics_rows:
+        schematics.append(Schematic(
+            classname = row[0], name = row[1], slug = row[2], tier = row[3],
+            type = row[4], required = [schematics[i] for i in row[5]],
+            recipes = [recipes[i] for i in row[6]]))
+
+    def optional(objects, i):
+        return objects[i] if i >= 0 else None
+
+    resources = [Resource(items[i], speed) for i, speed in resources_rows]
+    miners = [
+        Miner(classname = row[0], building = optional(buildings, row[1]),
+              allowed_resources = [items[i] for i in row[2]],
+              items_per_cycle = row[3], extract_cycle_time = row[4],
+              allow_liquids = row[5], allow_solids = row[6])
+        for row in miners_rows]
+    generators = [
+        Generator(classname = row[0], building = optional(buildings, row[1]),
+                  fuels = [Fuel(items[fuel[0]], optional(items, fuel[1]),
+                                optional(items, fuel[2]), fuel[3])
+                           for fuel in row[2]],
+                  power_production = row[3],
+                  power_production_exponent = row[4],
+                  water_to_power_ratio = row[5])
+        for row in generators_rows]
+    return World(name = name if name is not None else world_name,
+                 recipes = recipes, items = items, buildings = buildings,
+                 schematics = schematics, resources = resources,
+                 miners = miners, generators = generators)
+
+
+def save(world: World, file_dir: str=None, path: str=None) -> str:
+    """ Writes the snapshot of world, compiled from the dataset at file_dir.
+    The file is written next to it and renamed into place.
+    """
+    file_dir = os.path.abspath(file_dir or sp.get_file_dir())
+    path = path or default_path(file_dir)
+    mtime_ns, size = _source_signature(file_dir)
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, sys.version_info[0],
+                         sys.version_info[1], mtime_ns, size)
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    try:
+        with open(temp_path, 'wb') as snapshot_file:
+            snapshot_file.write(header)
+            snapshot_file.write(marshal.dumps(encode(world)))
+        os.replace(temp_path, path)
+    except OSError:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return path
+
+
+def is_fresh(file_dir: str=None, path: str=None) -> bool:
+    """ A snapshot is fresh when it is newer than the dataset and was
+    compiled from a file with the same mtime and size, by a compatible
+    interpreter.
+    """
+    file_dir = os.path.abspath(file_dir or sp.get_file_dir())
+    path = path or default_path(file_dir)
+    try:
+        if os.stat(path).st_mtime_ns < os.stat(file_dir).st_mtime_ns:
+            return False
+        with open(path, 'rb') as snapshot_file:
+            header = snapshot_file.read(HEADER.size)
+    except OSError:
+        return False
+    return _header_matches(header, _source_signature(file_dir))
+
+
+def ensure(world: World, file_dir: str=None) -> str:
+    """ Path of a fresh snapshot of world, saving one if needed: next to
+    the dataset or, when that is not writable, in the temp directory.
+    """
+    path = default_path(file_dir)
+    if is_fresh(file_dir, path):
+        return path
+    try:
+        return save(world, file_dir, path)
+    except OSError:
+        pass
+    path = fallback_path(file_dir)
+    if is_fresh(file_dir, path):
+        return path
+    return save(world, file_dir, path)
+
+
+def _header_matches(header: bytes, signature: tuple) -> bool:
+    if len(header) < HEADER.size:
+        return False
+    magic, version, major, minor, mtime_ns, size = HEADER.unpack(header)
+    return (magic == MAGIC and version == FORMAT_VERSION
+            and (major, minor) == sys.version_info[:2]
+            and (mtime_ns, size) == signature)
+
+
+def load(path: str, name: str=None, use_mmap: bool=False) -> World:
+    """ Loads a snapshot with a single read, or through a memory map. """
+    with open(path, 'rb') as snapshot_file:
+        if use_mmap:
+            with mmap.mmap(snapshot_file.fileno(), 0,
+                           access=mmap.ACCESS_READ) as mapped:
+                with memoryview(mapped) as view:
+                    with view[HEADER.size:] as body:
+                        payload = marshal.loads(body)
+        else:
+            payload = marshal.loads(
+                memoryview(snapshot_file.read())[HEADER.size:])
+    return decode(payload, name)
+
+
+def load_if_fresh(name: str=None, file_dir: str=None,
+                  path: str=None) -> World:
+    """ Returns the snapshot world, or None when it is missing or stale. """
+    if not is_fresh(file_dir, path):
+        return None
+    try:
+        return load(path or default_path(file_dir), name)
+    except (OSError, ValueError, EOFError, TypeError):
+        return None
+
+
+if __name__ == '__main__':
+    from world import Startup
+    source = sys.argv[1] if len(sys.argv) > 1 else None
+    compiled_world = Startup.build_world('snapshot', source)
+    print(save(compiled_world, source))
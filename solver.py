@@ -0,0 +1,276 @@
+from __future__ import annotations
+
+import warnings
+from typing import Dict, List
+
+import numpy as np
+from scipy import sparse
+from scipy.sparse import linalg as sparse_linalg
+
+from world import World, Item, ItemAmount, Recipe
+from error_handler import MyCustomError
+from graph import ProductionGraph
+
+# Rates closer to zero than this are treated as zero.
+TOLERANCE = 1e-9
+
+
+class RecipeMatrix:
+    """ Sparse item x recipe stoichiometry matrix of a world. Column r holds
+    the net items per minute of one machine running recipe r at 100% clock:
+    products are positive and ingredients negative.
+    """
+
+    def __init__(self, world: World, recipes: List[Recipe]=None) -> None:
+        self.world = world
+        self.items = list(world.items)
+        self.recipes = list(world.recipes if recipes is None else recipes)
+        self.item_ids = {item.classname: i
+                         for i, item in enumerate(self.items)}
+        self.recipe_ids = {recipe.classname: i
+                           for i, recipe in enumerate(self.recipes)}
+        rows, cols, values = [], [], []
+        for col, recipe in enumerate(self.recipes):
+            if not recipe.time:
+                continue
+            per_minute = 60/recipe.time
+            for product in recipe.products:
+                rows.append(self.item_ids[product.item.classname])
+                cols.append(col)
+                values.append(product.amount*per_minute)
+            for ingredient in recipe.ingredients:
+                rows.append(self.item_ids[ingredient.item.classname])
+                cols.append(col)
+                values.append(-ingredient.amount*per_minute)
+        # duplicate (row, col) pairs are summed, so a recipe consuming and
+        # producing the same item contributes its net rate
+        self.matrix = sparse.csc_matrix(
+            (values, (rows, cols)),
+            shape=(len(self.items), len(self.recipes)))
+
+    def item_vector(self, item_amounts: List[ItemAmount]) -> np.ndarray:
+        vector = np.zeros(len(self.items))
+        for item_amount in item_amounts:
+            vector[self.item_ids[item_amount.item.classname]] += float(
+                item_amount.amount)
+        return vector
+
+
+class Solution:
+    """ Result of a linear solve. machines maps recipes to machine counts at
+    100% clock, raw maps raw items to their consumption per minute and
+    surplus maps byproducts nothing consumes to their output per minute.
+    cycles lists the groups of items whose selected recipes feed each other.
+    """
+
+    def __init__(self, feasible: bool, message: str='',
+                 machines: Dict[Recipe, float]=None,
+                 raw: Dict[Item, float]=None,
+                 surplus: Dict[Item, float]=None,
+                 cycles: List[List[Item]]=None) -> None:
+        self.feasible = feasible
+        self.message = message
+        self.machines = machines if machines is not None else {}
+        self.raw = raw if raw is not None else {}
+        self.surplus = surplus if surplus is not None else {}
+        self.cycles = cycles if cycles is not None else []
+
+    def __str__(self) -> str:
+        if not self.feasible:
+            return f'infeasible: {self.message}'
+        lines = [f'{amount:.4g} x {recipe.name}'
+                 for recipe, amount in self.machines.items()]
+        lines += [f'raw {amount:.4g}/min {item.name}'
+                  for item, amount in self.raw.items()]
+        lines += [f'surplus {amount:.4g}/min {item.name}'
+                  for item, amount in self.surplus.items()]
+        return '\n'.join(lines)
+
+
+class LinearSolver:
+
+    def __init__(self, world: World, matrix: RecipeMatrix=None) -> None:
+        self.world = world
+        self.matrix = matrix if matrix is not None else RecipeMatrix(world)
+
+    def selected_recipe(self, item: Item, selection: dict) -> Recipe:
+        """ Recipe used for item: the one in selection (keyed by item
+        classname, None meaning raw) or else the item's default recipe.
+        """
+        return ProductionGraph.recipe_for(item, selection)
+
+    def check_selection(self, selection: dict) -> None:
+        """ Raises unless every selected recipe produces its item. """
+        for classname, recipe in selection.items():
+            item = self.world.get_item(classname)
+            if item is None:
+                raise MyCustomError(f'Unknown item {classname}.')
+            if recipe is not None:
+                ProductionGraph.amount_produced(recipe, item)
+
+    def subsystem(self, targets: List[Item], selection: dict) -> tuple:
+        """ Items to produce (each with its selected recipe) and raw items
+        reachable from targets.
+        """
+        produced = {}
+        raw = {}
+        stack = list(targets)
+        seen = set()
+        while stack:
+            item = stack.pop()
+            if item.classname in seen:
+                continue
+            seen.add(item.classname)
+            recipe = self.selected_recipe(item, selection)
+            if recipe is None:
+                raw[item.classname] = item
+                continue
+            produced[item.classname] = (item, recipe)
+            for ingredient in recipe.ingredients:
+                stack.append(ingredient.item)
+        return produced, raw
+
+    def solve(self, targets: List[ItemAmount],
+              selection: dict=None) -> Solution:
+        """ Solves net output rates (items per minute) for targets in one
+        sparse solve. selection overrides the recipe of some items and may
+        pick alternates, byproduct or Unpackage recipes; cycles between the
+        selected recipes are handled by the solve itself.
+        """
+        selection = selection if selection is not None else {}
+        self.check_selection(selection)
+        produced, raw = self.subsystem([x.item for x in targets], selection)
+        cycles = LinearSolver.find_cycles(produced)
+
+        row_items, recipes, shared = LinearSolver.assign_equations(
+            list(produced.values()))
+        for item in shared:
+            del produced[item.classname]
+            raw[item.classname] = item
+        if not recipes:
+            return Solution(True, 'targets are raw resources',
+                            raw={x.item: float(x.amount) for x in targets},
+                            cycles=cycles)
+
+        rows = [self.matrix.item_ids[x.classname] for x in row_items]
+        cols = [self.matrix.recipe_ids[x.classname] for x in recipes]
+        system = self.matrix.matrix[:, cols]
+        target_vector = self.matrix.item_vector(targets)
+        rates = self._solve_rows(system[rows, :].tocsc(),
+                                 target_vector[rows])
+        if rates is None:
+            return Solution(False, 'the selected recipes form a singular '
+                            'system (a cycle with no net output)',
+                            cycles=cycles)
+        if (rates < -TOLERANCE).any():
+            negative = [recipes[i].name
+                        for i in np.flatnonzero(rates < -TOLERANCE)]
+            return Solution(False, 'negative machine counts needed for '
+                            + ', '.join(negative), cycles=cycles)
+
+        net = system @ rates - target_vector
+        machines = {recipe: float(rate)
+                    for recipe, rate in zip(recipes, rates)
+                    if rate > TOLERANCE}
+        raw_usage = {}
+        surplus = {}
+        for i in np.flatnonzero(np.abs(net) > TOLERANCE):
+            item = self.matrix.items[i]
+            if item.classname in raw and net[i] < 0:
+                raw_usage[item] = float(-net[i])
+            elif net[i] > 0:
+                surplus[item] = float(net[i])
+            elif item.classname not in produced:
+                raw_usage[item] = float(-net[i])
+        return Solution(True, machines=machines, raw=raw_usage,
+                        surplus=surplus, cycles=cycles)
+
+    @staticmethod
+    def assign_equations(pairs: List[tuple]) -> tuple:
+        """ Splits (item, recipe) pairs into the items balanced by their own 
+        recipe and the items whose recipe is already selected for another 
+        one, e.g. Heavy Oil Residue whose default recipe is Plastic. A shared
+        recipe is kept by the item that is its first product. Shared items 
+        are left unbalanced: their net output becomes surplus or is imported
+        like a raw resource.
+        """
+        owners = {}
+        for item, recipe in pairs:
+            owner = owners.get(recipe)
+            if owner is None or (
+                    recipe.products
+                    and recipe.products[0].item.classname == item.classname):
+                owners[recipe] = item
+        row_items = list(owners.values())
+        recipes = list(owners)
+        shared = [item for item, recipe in pairs
+                  if owners[recipe] is not item]
+        return row_items, recipes, shared
+
+    @staticmethod
+    def _solve_rows(system, target_vector: np.ndarray) -> np.ndarray:
+        try:
+            with warnings.catch_warnings():
+                warnings.simplefilter('error', sparse_linalg.MatrixRankWarning)
+                rates = sparse_linalg.spsolve(system, target_vector)
+        except (RuntimeError, sparse_linalg.MatrixRankWarning):
+            return None
+        rates = np.atleast_1d(rates)
+        if not np.isfinite(rates).all():
+            return None
+        return rates
+
+    @staticmethod
+    def find_cycles(produced: dict) -> List[List[Item]]:
+        """ Strongly connected groups of items whose selected recipes
+        consume each other, found with an iterative Tarjan pass.
+        """
+        index = {}
+        low = {}
+        on_stack = set()
+        stack = []
+        cycles = []
+        counter = 0
+
+        def successors(classname):
+            item, recipe = produced[classname]
+            return [x.item.classname for x in recipe.ingredients
+                    if x.item.classname in produced]
+
+        for start in produced:
+            if start in index:
+                continue
+            work = [(start, iter(successors(start)))]
+            index[start] = low[start] = counter
+            counter += 1
+            stack.append(start)
+            on_stack.add(start)
+            while work:
+                node, children = work[-1]
+                child = next(children, None)
+                if child is not None:
+                    if child not in index:
+                        index[child] = low[child] = counter
+                        counter += 1
+                        stack.append(child)
+                        on_stack.add(child)
+                        work.append((child, iter(successors(child))))
+                    elif child in on_stack:
+                        low[node] = min(low[node], index[child])
+                    continue
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[node])
+                if low[node] == index[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(produced[member][0])
+                        if member == node:
+                            break
+                    self_loop = node in successors(node)
+                    if len(component) > 1 or self_loop:
+                        cycles.append(component)
+        return cycles
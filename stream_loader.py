@@ -0,0 +1,169 @@
+""" Streaming load of data.json.
+
+satisfactory_parser.parse_file materializes the whole JSON tree before any
+object is built. Here the file is read in chunks and every entry of a
+section is decoded on its own with JSONDecoder.raw_decode, turned into its
+model object and dropped, so only the current chunk and one entry of raw
+JSON are alive at a time. Entries of sections that were not requested are
+dropped right after decoding (the C decoder is faster than scanning for
+their end in Python), and building descriptions are dropped unless asked
+for.
+
+The file must be an object of sections, each an object of entries, which
+is the layout of the bundled data.json.
+"""
+from __future__ import annotations
+
+import json
+import re
+from typing import Iterable, Iterator, Tuple
+
+import satisfactory_parser as sp
+from world import World, ObjectInstantiator, Startup
+from error_handler import MyCustomError
+
+CHUNK_SIZE = 1 << 16
+ALL_SECTIONS = ('items', 'buildings', 'recipes', 'schematics', 'resources',
+                'miners', 'generators')
+
+_whitespace = re.compile(r'\s*')
+# what may follow a number cut off by the end of the buffer: '12' of
+# '12.5' is followed by '.', '12' of '1234' by nothing
+_number_tail = re.compile(r'[0-9.eE+-]*\Z')
+_decoder = json.JSONDecoder()
+
+
+class EntryReader:
+    """ Iterates (section, key, entry) over the requested sections of a
+    dataset file. Entries of other sections are not yielded.
+    """
+
+    def __init__(self, path: str, sections: Iterable[str]=None,
+                 chunk_size: int=CHUNK_SIZE) -> None:
+        self.path = path
+        self.sections = frozenset(sections) if sections is not None else None
+        self.chunk_size = chunk_size
+        self.buffer = ''
+        self.position = 0
+        self.file = None
+
+    def _fill(self, required: bool=True) -> bool:
+        """ Drops consumed text and reads the next chunk, at least as long
+        as the pending text so an entry spanning many chunks is re-read a
+        logarithmic number of times. False at the end of the file, which
+        raises when more text is required.
+        """
+        chunk = self.file.read(max(self.chunk_size,
+                                   len(self.buffer) - self.position))
+        if not chunk:
+            if required:
+                raise MyCustomError(f'Unexpected end of {self.path}.')
+            return False
+        self.buffer = self.buffer[self.position:] + chunk
+        self.position = 0
+        return True
+
+    def _peek(self) -> str:
+        """ Next non-whitespace character, without consuming it. """
+        while True:
+            self.position = _whitespace.match(self.buffer,
+                                              self.position).end()
+            if self.position < len(self.buffer):
+                return self.buffer[self.position]
+            self._fill()
+
+    def _expect(self, char: str) -> None:
+        if self._peek() != char:
+            raise MyCustomError(
+                f'Expected {char!r} in {self.path}, found '
+                f'{self.buffer[self.position:self.position + 20]!r}.')
+        self.position += 1
+
+    def _read(self):
+        """ Decodes the value (object, array, string, number or literal) at
+        the position, reading more chunks while it is cut off by the end of
+        the buffer. A number or literal decoded from the end of the buffer
+        may be a cut off prefix of a longer one, so it is decoded again once
+        more text was read.
+        """
+        self._peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buffer, self.position)
+            except json.JSONDecodeError:
+                self._fill()
+                continue
+            if (not isinstance(value, (dict, list, str))
+                    and _number_tail.match(self.buffer, end)
+                    and self._fill(required=False)):
+                continue
+            self.position = end
+            return value
+
+    def _next_member(self) -> bool:
+        """ Consumes a separating comma; False at the closing brace. """
+        char = self._peek()
+        if char == ',':
+            self.position += 1
+            char = self._peek()
+        if char == '}':
+            self.position += 1
+            return False
+        return True
+
+    def __iter__(self) -> Iterator[Tuple[str, str, dict]]:
+        with open(self.path, encoding='utf-8') as self.file:
+            self._expect('{')
+            while self._next_member():
+                section = self._read()
+                self._expect(':')
+                wanted = self.sections is None or section in self.sections
+                if self._peek() != '{':
+                    self._read()
+                    continue
+                self.position += 1
+                while self._next_member():
+                    key = self._read()
+                    self._expect(':')
+                    entry = self._read()
+                    if wanted:
+                        yield section, key, entry
+        self.file = None
+        self.buffer = ''
+        self.position = 0
+
+
+def load_world(name: str, file_dir: str=None,
+               sections: Iterable[str]=ALL_SECTIONS,
+               keep_descriptions: bool=False,
+               chunk_size: int=CHUNK_SIZE) -> World:
+    """ Builds a World while streaming the dataset. Items, buildings, draft
+    recipes and draft schematics are instantiated as their entries arrive;
+    the few resources, miners and generators entries are kept until the
+    items and buildings they refer to are known. Entries of sections left
+    out of sections are decoded and then dropped; those sections load
+    empty.
+    """
+    path = file_dir or sp.get_file_dir()
+    instantiator = ObjectInstantiator()
+    items = []
+    buildings = []
+    draft_recipes = []
+    draft_schematics = []
+    raw = {'resources': {}, 'miners': {}, 'generators': {}}
+    for section, key, entry in EntryReader(path, sections, chunk_size):
+        if section == 'items':
+            items.append(instantiator.instantiate_item(entry))
+        elif section == 'buildings':
+            buildings.append(instantiator.instantiate_building(
+                entry, keep_descriptions))
+        elif section == 'recipes':
+            draft_recipes.append(instantiator.instantiate_draft_recipe(entry))
+        elif section == 'schematics':
+            draft_schematics.append(
+                instantiator.instantiate_draft_schematic(entry))
+        elif section in raw:
+            raw[section][key] = entry
+    return Startup.assemble_world(
+        name, items, buildings, draft_recipes, draft_schematics,
+        raw['resources'], raw['miners'], raw['generators'])
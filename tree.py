@@ -1,7 +1,8 @@
 from __future__ import annotations
 
+from collections import deque
 from decimal import Decimal
-from typing import List
+from typing import Iterator, List, Tuple
 
 from world import World, Startup, Item, ItemAmount, Building, Recipe
 from error_handler import MyCustomError
@@ -9,6 +10,8 @@ from error_handler import MyCustomError
 
 class Node():
     
+    __slots__ = ('building', 'recipe', 'data', 'child')
+    
     def __init__(self, data: object, child: List[object]=None, 
                  building: Building=None, recipe: Recipe=None) -> None:
         self.building = building
@@ -49,10 +52,50 @@ class Node():
         
 
 class Tree():
+    """ Traversals use explicit stacks and are generators, so deep trees do 
+    not hit the recursion limit and nodes can be streamed without building a
+    list.
+    """
     
     def __init__(self, root: Node) -> None:
         self.root = root
 
+    def __iter__(self) -> Iterator[Node]:
+        return self.iter_preorder()
+
+    def iter_preorder(self) -> Iterator[Node]:
+        """ Each node before its children, children in order. """
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            yield node
+            stack.extend(reversed(node.child))
+
+    def iter_postorder(self) -> Iterator[Node]:
+        """ Each node after all of its children. """
+        stack = [(self.root, False)]
+        while stack:
+            node, expanded = stack.pop()
+            if expanded:
+                yield node
+                continue
+            stack.append((node, True))
+            stack.extend((child, False) for child in reversed(node.child))
+
+    def iter_bfs(self) -> Iterator[Tuple[int, Node]]:
+        """ (depth, node) pairs level by level, the root at depth 0. """
+        queue = deque([(0, self.root)])
+        while queue:
+            depth, node = queue.popleft()
+            yield depth, node
+            queue.extend((depth + 1, child) for child in node.child)
+
+    def iter_leaves(self) -> Iterator[Node]:
+        """ Nodes without children, in pre-order. """
+        for node in self.iter_preorder():
+            if not node.child:
+                yield node
+
 
 
 
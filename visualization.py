@@ -0,0 +1,81 @@
+""" Tree rendering. The diagrams package (and Graphviz behind it) is only
+imported by the draw_* methods; to_dot and render use render.py instead.
+"""
+from __future__ import annotations
+
+import instrumentation
+from tree import Tree
+from render import GraphRenderer
+
+
+def load_diagrams() -> tuple:
+    from diagrams import Diagram
+    from diagrams.aws.ml import ApacheMxnetOnAWS as cube
+    from diagrams.aws.enablement import ManagedServices as building_icon
+    return Diagram, cube, building_icon
+
+
+class TreeVisualization():
+    
+    def __init__(self, tree: Tree) -> None:
+        self.tree = tree
+
+    def to_dot(self) -> str:
+        """ DOT text of the tree with shared nodes merged. """
+        with instrumentation.timer('render.to_dot'):
+            return GraphRenderer.from_tree(self.tree).to_dot()
+
+    def render(self, path: str, asynchronous: bool=False):
+        """ Writes the merged tree to a .dot, .json or .svg file without
+        Graphviz. With asynchronous, returns a Future of the path.
+        """
+        renderer = GraphRenderer.from_tree(self.tree)
+        if asynchronous:
+            return renderer.render_async(path)
+        return renderer.render(path)
+    
+    def draw_simple_only_ingredients(self):
+        root = self.tree.root
+        root_name = root.__str__()
+        diagram_name = f'Recipe for producing {root.__str__()}.'
+        Diagram, cube, building_icon = load_diagrams()
+        with instrumentation.timer('render.diagrams'), \
+                Diagram(name = diagram_name, direction = 'BT'):
+            viz = cube(root_name)
+            stack = [(viz, self.tree.root)]
+            while stack:
+                viz_item, node = stack.pop()
+                children = []
+                for item in node.child:
+                    new_viz_item = cube(label = item.__str__())
+                    viz_item << new_viz_item
+                    children.append((new_viz_item, item))
+                stack.extend(reversed(children))
+            
+    def draw_simple(self):
+        root = self.tree.root
+        root_name = root.__str__()
+        diagram_name = f'Recipe for producing {root.__str__()}.'
+        Diagram, cube, building_icon = load_diagrams()
+        with instrumentation.timer('render.diagrams'), \
+                Diagram(name = diagram_name, direction = 'BT'):
+            viz = cube(root_name)
+            stack = [(viz, self.tree.root)]
+            while stack:
+                viz_item, node = stack.pop()
+                
+                if node.building is not None:
+                    new_viz_building = building_icon(
+                        label = node.building.name)
+                    viz_item << new_viz_building
+                
+                children = []
+                for item in node.child:
+                    new_viz_item = cube(label = item.__str__())
+                    if(node.building is not None):
+                        new_viz_building << new_viz_item
+                    else:
+                        print("tava None")
+                        viz_item << new_viz_item
+                    children.append((new_viz_item, item))
+                stack.extend(reversed(children))
@@ -4,13 +4,20 @@ from decimal import Decimal
 from typing import List
 
 import satisfactory_parser as sp
+import instrumentation
 from error_handler import MyCustomError
 
 class Building:
     
+    __slots__ = ('classname', 'name', 'slug', 'description', 
+                 'power_consumption', 'input_qty', 'output_qty',
+                 'power_consumption_exponent', 'manufacturing_speed')
+    
     def __init__(self, classname: str, name: str, slug: str, description: str, 
                  power_consumption: Decimal=None, input_qty: int=None, 
-                 output_qty: int=None) -> None:
+                 output_qty: int=None, 
+                 power_consumption_exponent: Decimal=1.6,
+                 manufacturing_speed: Decimal=1) -> None:
         self.classname = classname
         self.name = name
         self.slug = slug
@@ -18,20 +25,41 @@ class Building:
         self.power_consumption = power_consumption
         self.input_qty = input_qty
         self.output_qty = output_qty
+        self.power_consumption_exponent = power_consumption_exponent
+        self.manufacturing_speed = manufacturing_speed
 
 
 class Item:
+    
+    __slots__ = ('classname', 'name', 'slug', 'stack_size', 'liquid', 
+                 'sink_points', '_default_recipe', 'energy_value',
+                 'recipe_generation')
 
     def __init__(self, classname: str, name: str, slug: str, 
                  stack_size: Decimal, liquid: bool, sink_points: Decimal, 
-                 default_recipe: Recipe=None) -> None:
+                 default_recipe: Recipe=None, 
+                 energy_value: Decimal=0) -> None:
         self.classname = classname
         self.name = name
         self.slug = slug
         self.stack_size = stack_size
         self.liquid = liquid
         self.sink_points = sink_points
-        self.default_recipe = default_recipe
+        self._default_recipe = default_recipe
+        self.energy_value = energy_value
+        # bumped whenever the default recipe changes, so caches of recipe
+        # expansions through this item can tell their entries are stale
+        self.recipe_generation = 0
+
+    @property
+    def default_recipe(self) -> Recipe:
+        return self._default_recipe
+
+    @default_recipe.setter
+    def default_recipe(self, recipe: Recipe) -> None:
+        if recipe is not self._default_recipe:
+            self.recipe_generation += 1
+        self._default_recipe = recipe
     
     def __str__(self) -> str:
         return 'name = '+self.name+', stack size = '+str(self.stack_size)
@@ -45,6 +73,8 @@ class Item:
 
 class ItemAmount:
     
+    __slots__ = ('item', 'amount')
+    
     def __init__(self, item: Item, amount: Decimal) -> None:
         self.item = item
         self.amount = amount
@@ -58,6 +88,9 @@ class ItemAmount:
 
 class Recipe:
     
+    __slots__ = ('classname', 'name', 'slug', 'is_alternate', 'time', 
+                 'ingredients', 'products', 'buildings')
+    
     def __init__(self, classname: str, name: str, slug: str, 
                  is_alternate: bool, time: Decimal, 
                  ingredients: List[ItemAmount],
@@ -89,10 +122,17 @@ class Recipe:
         
 
 class DraftRecipe:
+    """ Recipe whose ingredients and products are still (classname, amount)
+    tuples and whose buildings are classnames. Drafts only live until the 
+    Binder turns them into Recipes.
+    """
+    
+    __slots__ = ('classname', 'name', 'slug', 'is_alternate', 'time', 
+                 'ingredients', 'products', 'buildings')
     
     def __init__(self, classname: str, name: str, slug: str, 
-                 is_alternate: bool, time: Decimal, ingredients: List[str],
-                 products: List[str], produced_in: List[str]) -> None:       
+                 is_alternate: bool, time: Decimal, ingredients: List[tuple],
+                 products: List[tuple], produced_in: List[str]) -> None:       
         self.classname = classname
         self.name = name
         self.slug = slug
@@ -103,6 +143,125 @@ class DraftRecipe:
         self.buildings = produced_in
 
 
+class Schematic:
+    """ Milestone, research or shop unlock. required holds the schematics 
+    that must be bought first and recipes the recipes it unlocks.
+    """
+    
+    __slots__ = ('classname', 'name', 'slug', 'tier', 'type', 'required',
+                 'recipes')
+    
+    def __init__(self, classname: str, name: str, slug: str, tier: int, 
+                 type: str, required: List[Schematic], 
+                 recipes: List[Recipe]) -> None:
+        self.classname = classname
+        self.name = name
+        self.slug = slug
+        self.tier = tier
+        self.type = type
+        self.required = required
+        self.recipes = recipes
+
+    def __str__(self) -> str:
+        return f'name = {self.name}, tier = {self.tier}'
+
+
+class DraftSchematic:
+    """ Schematic whose requirements and recipes are still classnames. """
+    
+    __slots__ = ('classname', 'name', 'slug', 'tier', 'type', 'required',
+                 'recipes')
+    
+    def __init__(self, classname: str, name: str, slug: str, tier: int, 
+                 type: str, required: List[str], 
+                 recipes: List[str]) -> None:
+        self.classname = classname
+        self.name = name
+        self.slug = slug
+        self.tier = tier
+        self.type = type
+        self.required = required
+        self.recipes = recipes
+
+
+class Resource:
+    """ Item that is extracted from resource nodes. """
+    
+    __slots__ = ('item', 'speed')
+    
+    def __init__(self, item: Item, speed: Decimal=1) -> None:
+        self.item = item
+        self.speed = speed
+
+
+class Miner:
+    """ Extractor building. Liquid amounts in the dataset are in liters 
+    (1/1000 of the m3 used by recipes).
+    """
+    
+    __slots__ = ('classname', 'building', 'allowed_resources', 
+                 'items_per_cycle', 'extract_cycle_time', 'allow_liquids', 
+                 'allow_solids')
+    
+    def __init__(self, classname: str, building: Building, 
+                 allowed_resources: List[Item], items_per_cycle: Decimal, 
+                 extract_cycle_time: Decimal, allow_liquids: bool, 
+                 allow_solids: bool) -> None:
+        self.classname = classname
+        self.building = building
+        self.allowed_resources = allowed_resources
+        self.items_per_cycle = items_per_cycle
+        self.extract_cycle_time = extract_cycle_time
+        self.allow_liquids = allow_liquids
+        self.allow_solids = allow_solids
+
+    @property
+    def name(self) -> str:
+        return self.building.name if self.building else self.classname
+
+    def rate(self, item: Item) -> float:
+        """ Items (or m3) per minute on a normal node at 100% clock. """
+        rate = self.items_per_cycle/self.extract_cycle_time*60
+        return rate/1000 if item.liquid else rate
+
+
+class Fuel:
+    
+    __slots__ = ('item', 'supplemental_item', 'byproduct', 
+                 'byproduct_amount')
+    
+    def __init__(self, item: Item, supplemental_item: Item=None, 
+                 byproduct: Item=None, byproduct_amount: Decimal=0) -> None:
+        self.item = item
+        self.supplemental_item = supplemental_item
+        self.byproduct = byproduct
+        self.byproduct_amount = byproduct_amount
+
+
+class Generator:
+    """ Power plant. power_production is in MW and water_to_power_ratio in 
+    liters of water per MW each second.
+    """
+    
+    __slots__ = ('classname', 'building', 'fuels', 'power_production', 
+                 'power_production_exponent', 'water_to_power_ratio')
+    
+    def __init__(self, classname: str, building: Building, fuels: List[Fuel],
+                 power_production: Decimal, 
+                 power_production_exponent: Decimal=1.3,
+                 water_to_power_ratio: Decimal=0) -> None:
+        self.classname = classname
+        self.building = building
+        self.fuels = fuels
+        self.power_production = power_production
+        self.power_production_exponent = power_production_exponent
+        self.water_to_power_ratio = water_to_power_ratio
+
+    @property
+    def name(self) -> str:
+        return self.building.name if self.building else self.classname
+
+
 class ObjectInstantiator:
     
     @staticmethod
@@ -112,65 +271,161 @@ class ObjectInstantiator:
     @staticmethod
     def instantiate_items(items_dict: dict) -> List(Item):
         """ Loops trough itens dict and instantiate objects. """
-        items = []
-        for key, value in items_dict.items():
-            classname = value['className']
-            name = value['name']
-            slug = value['slug']
-            stack_size = value['stackSize']
-            liquid = value['liquid']
-            sink_points = value['sinkPoints']
-            
-            instatiated_item = Item(classname, name, slug, stack_size, liquid, 
-                                    sink_points)
-            items.append(instatiated_item)
-        return items
+        return [ObjectInstantiator.instantiate_item(value) 
+                for value in items_dict.values()]
+
+    @staticmethod
+    def instantiate_item(value: dict) -> Item:
+        """ Instantiates one entry of the items section. """
+        classname = value['className']
+        name = value['name']
+        slug = value['slug']
+        stack_size = value['stackSize']
+        liquid = value['liquid']
+        sink_points = value['sinkPoints']
+        energy_value = value.get('energyValue', 0)
+        
+        return Item(classname, name, slug, stack_size, liquid, sink_points,
+                    energy_value=energy_value)
 
     @staticmethod
     def instantiate_buildings(buildings_dict: dict) -> List(Building):
         """ Loops trough buildings dict and instantiate objects. """
-        buildings = []
-        for key, value in buildings_dict.items():
-            classname = value['className']
-            name = value['name']
-            slug = value['slug']
-            description = value['description']
-            power_consumption = 0
-            if value.get('metadata') is not None:
-                if value['metadata'].get('powerConsumption') is not None:
-                    power_consumption = value['metadata']['powerConsumption']
-        
-            instantiated_building = Building(
-                classname = classname, name = name, slug = slug, 
-                description = description, 
-                power_consumption = power_consumption)
-            buildings.append(instantiated_building)
-        return buildings
+        return [ObjectInstantiator.instantiate_building(value) 
+                for value in buildings_dict.values()]
+
+    @staticmethod
+    def instantiate_building(value: dict, 
+                             keep_description: bool=True) -> Building:
+        """ Instantiates one entry of the buildings section. """
+        classname = value['className']
+        name = value['name']
+        slug = value['slug']
+        description = value['description'] if keep_description else None
+        power_consumption = 0
+        power_consumption_exponent = 1.6
+        manufacturing_speed = 1
+        metadata = value.get('metadata')
+        if metadata is not None:
+            if metadata.get('powerConsumption') is not None:
+                power_consumption = metadata['powerConsumption']
+            if metadata.get('powerConsumptionExponent') is not None:
+                power_consumption_exponent = metadata[
+                    'powerConsumptionExponent']
+            if metadata.get('manufacturingSpeed'):
+                manufacturing_speed = metadata['manufacturingSpeed']
+    
+        return Building(
+            classname = classname, name = name, slug = slug, 
+            description = description, 
+            power_consumption = power_consumption,
+            power_consumption_exponent = power_consumption_exponent,
+            manufacturing_speed = manufacturing_speed)
 
     @staticmethod
     def instantiate_draft_recipes(recipes_dict: dict) -> List(DraftRecipe):
         """ Loops trough recipes dict and instantiate draft objects. 
         Recipes must be later correlated with buildings and itens before used.
         """
-        draft_recipes = []
-        for key, value in recipes_dict.items():
-            classname = value['className']
-            name = value['name']
-            slug = value['slug']
-            is_alternate = value['alternate']
-            time = value['time']
-            ingredients = value['ingredients']
-            products = value['products']
-            produced_in = value['producedIn']
-        
-            instantiated_draft_recipe = DraftRecipe(
-                classname = classname, name = name, slug = slug, 
-                is_alternate = is_alternate, time = time, 
-                ingredients = ingredients, products = products,
-                produced_in = produced_in)
-            draft_recipes.append(instantiated_draft_recipe)
-        return draft_recipes
+        return [ObjectInstantiator.instantiate_draft_recipe(value) 
+                for value in recipes_dict.values()]
+
+    @staticmethod
+    def instantiate_draft_recipe(value: dict) -> DraftRecipe:
+        """ Instantiates one entry of the recipes section. """
+        classname = value['className']
+        name = value['name']
+        slug = value['slug']
+        is_alternate = value['alternate']
+        time = value['time']
+        ingredients = tuple((x['item'], x['amount']) 
+                            for x in value['ingredients'])
+        products = tuple((x['item'], x['amount']) 
+                         for x in value['products'])
+        produced_in = tuple(value['producedIn'])
+    
+        return DraftRecipe(
+            classname = classname, name = name, slug = slug, 
+            is_alternate = is_alternate, time = time, 
+            ingredients = ingredients, products = products,
+            produced_in = produced_in)
     
+    @staticmethod
+    def instantiate_draft_schematics(schematics_dict: dict
+                                     ) -> List(DraftSchematic):
+        """ Loops trough schematics dict and instantiate draft objects. """
+        return [ObjectInstantiator.instantiate_draft_schematic(value) 
+                for value in schematics_dict.values()]
+
+    @staticmethod
+    def instantiate_draft_schematic(value: dict) -> DraftSchematic:
+        """ Instantiates one entry of the schematics section. """
+        return DraftSchematic(
+            classname = value['className'], name = value['name'], 
+            slug = value['slug'], tier = value['tier'], 
+            type = value['type'], 
+            required = tuple(value['requiredSchematics']),
+            recipes = tuple(value['unlock']['recipes']))
+
+    @staticmethod
+    def instantiate_resources(resources_dict: dict, 
+                              items: dict) -> List(Resource):
+        """ Loops trough resources dict. items is a classname index; 
+        resources of unknown items are skipped.
+        """
+        resources = []
+        for key, value in resources_dict.items():
+            item = items.get(value['item'])
+            if item is not None:
+                resources.append(Resource(item, value.get('speed', 1)))
+        return resources
+
+    @staticmethod
+    def instantiate_miners(miners_dict: dict, items: dict, 
+                           buildings: dict) -> List(Miner):
+        """ Loops trough miners dict. Miners are Build_ classes whose 
+        building entries are the matching Desc_ classes.
+        """
+        miners = []
+        for key, value in miners_dict.items():
+            classname = value['className']
+            building = buildings.get(classname.replace('Build_', 'Desc_', 1))
+            miners.append(Miner(
+                classname = classname, building = building,
+                allowed_resources = [
+                    items[x] for x in value['allowedResources'] 
+                    if x in items],
+                items_per_cycle = value['itemsPerCycle'], 
+                extract_cycle_time = value['extractCycleTime'],
+                allow_liquids = value['allowLiquids'], 
+                allow_solids = value['allowSolids']))
+        return miners
+
+    @staticmethod
+    def instantiate_generators(generators_dict: dict, items: dict, 
+                               buildings: dict) -> List(Generator):
+        """ Loops trough generators dict. Fuels of unknown items are 
+        skipped.
+        """
+        generators = []
+        for key, value in generators_dict.items():
+            fuels = []
+            for fuel in value['fuels']:
+                if fuel['item'] not in items:
+                    continue
+                fuels.append(Fuel(
+                    item = items[fuel['item']],
+                    supplemental_item = items.get(fuel['supplementalItem']),
+                    byproduct = items.get(fuel['byproduct']),
+                    byproduct_amount = fuel['byproductAmount'] or 0))
+            generators.append(Generator(
+                classname = value['className'], 
+                building = buildings.get(value['className']), fuels = fuels,
+                power_production = value['powerProduction'],
+                power_production_exponent = value['powerProductionExponent'],
+                water_to_power_ratio = value['waterToPowerRatio']))
+        return generators
+
     @staticmethod
     def instantiate_recipes(recipes_dict: dict) -> List(Recipe):
         """ Instantiate recipes from pre-processed recipes list. """
@@ -191,12 +446,92 @@ class ObjectInstantiator:
         return recipes            
 
 
+class Indexer:
+    """ Builds the dictionary indexes used by the binder and by World. When 
+    two objects share a key (some buildings and recipes share names), the 
+    first one in dataset order is kept.
+    """
+    
+    @staticmethod
+    def by_classname(objects: list) -> dict:
+        return {obj.classname: obj for obj in reversed(objects)}
+
+    @staticmethod
+    def by_slug(objects: list) -> dict:
+        return {obj.slug: obj for obj in reversed(objects)}
+
+    @staticmethod
+    def by_name(objects: list) -> dict:
+        return {obj.name.lower(): obj for obj in reversed(objects)}
+
+    @staticmethod
+    def by_product(recipes: List[Recipe]) -> dict:
+        """ Maps item classname to the recipes producing it. """
+        index = {}
+        for recipe in recipes:
+            for product in recipe.products:
+                index.setdefault(product.item.classname, []).append(recipe)
+        return index
+
+    @staticmethod
+    def by_ingredient(recipes: List[Recipe]) -> dict:
+        """ Maps item classname to the recipes consuming it. """
+        index = {}
+        for recipe in recipes:
+            for ingredient in recipe.ingredients:
+                index.setdefault(ingredient.item.classname, []).append(recipe)
+        return index
+
+
+class RecipePolicy:
+    """ Chooses the default recipe of an item among the recipes producing it.
+    
+    The default policy keeps the historical rules: the first standard recipe 
+    in dataset order that is not excluded and is not an Unpackage recipe. 
+    Overrides map item classnames to the recipe classname the user picked and
+    win over every other rule. With prefer_alternates, the first allowed 
+    alternate is taken when the item has one. available, a set of recipe
+    classnames such as Progression.available(), hides locked recipes.
+    """
+    
+    def __init__(self, prefer_alternates: bool=False, 
+                 overrides: dict=None, available: frozenset=None) -> None:
+        self.prefer_alternates = prefer_alternates
+        self.overrides = overrides if overrides is not None else {}
+        self.available = available
+
+    @staticmethod
+    def is_allowed(recipe: Recipe) -> bool:
+        return (recipe.classname not in Binder.default_recipe_exclusions
+                and 'Unpackage' not in recipe.classname)
+
+    def choose(self, item: Item, candidates: List[Recipe]) -> Recipe:
+        if item.classname in Binder.item_recipe_exclusion:
+            return None
+        if self.available is not None:
+            candidates = [x for x in candidates 
+                          if x.classname in self.available]
+        override = self.overrides.get(item.classname)
+        if override is not None:
+            for recipe in candidates:
+                if recipe.classname == override:
+                    return recipe
+        if self.prefer_alternates:
+            for recipe in candidates:
+                if recipe.is_alternate and RecipePolicy.is_allowed(recipe):
+                    return recipe
+        for recipe in candidates:
+            if not recipe.is_alternate and RecipePolicy.is_allowed(recipe):
+                return recipe
+        return None
+
+
 class Binder:
     
-    default_recipe_exclusions = [
+    default_recipe_exclusions = frozenset([
         'Recipe_UnpackageOilResidue_C', 'Recipe_UnpackageOil_C',
-        'Recipe_UnpackageNitrogen_C', 'Recipe_UnpackageOil_C', 'Water']
-    item_recipe_exclusion = ['Desc_Water_C']
+        'Recipe_UnpackageNitrogen_C', 'Recipe_UnpackageOil_C', 'Water'])
+    item_recipe_exclusion = frozenset(['Desc_Water_C'])
     
     @staticmethod
     def bind_recipes(items: List[Item], buildings: List[Building],
@@ -205,14 +540,16 @@ class Binder:
         if items is None or buildings is None:
             raise MyCustomError("""Itens and buildings must be instantiated 
                                 first.""")  
+        items_index = Indexer.by_classname(items)
+        buildings_index = Indexer.by_classname(buildings)
         for recipe in draft_recipes:
             
             binded_ingredients = Binder.search_ingredients(
-                recipe.ingredients, items)
+                recipe.ingredients, items_index)
             binded_products = Binder.search_products(
-                recipe.products, items)
+                recipe.products, items_index)
             binded_buildings = Binder.search_buildings(
-                recipe.buildings, buildings)
+                recipe.buildings, buildings_index)
             
             recipes_list.append(
                 Recipe(classname = recipe.classname, name = recipe.name, 
@@ -225,82 +562,186 @@ class Binder:
         return recipes_list
 
     @staticmethod
-    def bind_default_recipes(items: List[Item], recipes: List[Recipe]
-                             ) -> List[Item]:
-        
-        def first(iterable, default=None, key=None):
-            if key is None:
-                for el in iterable:
-                    if el:
-                        return el
-            else:
-                for el in iterable:
-                    if key(el):
-                        return el
-            return default
-        
-        temp_items = items
-        for item in temp_items:
-            item.default_recipe = first(
-                recipe for recipe in recipes for product in recipe.products 
-                if item.classname == product.item.classname 
-                and recipe.is_alternate == False
-                and recipe.classname not in Binder.default_recipe_exclusions
-                and 'Unpackage' not in recipe.classname
-                and item.classname not in Binder.item_recipe_exclusion)
-        binded_items = temp_items
-        return binded_items
+    def bind_default_recipes(items: List[Item], recipes: List[Recipe],
+                             policy: RecipePolicy=None, 
+                             recipes_by_product: dict=None) -> List[Item]:
+        """ Sets the default recipe of every item. recipes_by_product may be
+        passed (e.g. World.recipes_by_product) to skip the pass over recipes.
+        """
+        if policy is None:
+            policy = RecipePolicy()
+        if recipes_by_product is None:
+            recipes_by_product = Indexer.by_product(recipes)
+        for item in items:
+            item.default_recipe = policy.choose(
+                item, recipes_by_product.get(item.classname, []))
+        return items
+
+    @staticmethod
+    def bind_schematics(draft_schematics: List[DraftSchematic],
+                        recipes: List[Recipe]) -> List[Schematic]:
+        """ Resolves requirements and unlocked recipes. Schematics are 
+        returned in topological order, every one after its requirements.
+        Unknown classnames are skipped.
+        """
+        drafts = Indexer.by_classname(draft_schematics)
+        recipes_index = Indexer.by_classname(recipes)
+        bound = {}
+        schematics = []
+        for draft in draft_schematics:
+            if draft.classname in bound:
+                continue
+            stack = [(draft, 0)]
+            visiting = {draft.classname}
+            while stack:
+                current, position = stack.pop()
+                required = [x for x in current.required if x in drafts]
+                if position < len(required):
+                    stack.append((current, position + 1))
+                    child = drafts[required[position]]
+                    if child.classname in visiting:
+                        raise MyCustomError(
+                            f'Schematic {child.name} requires itself.')
+                    if child.classname not in bound:
+                        visiting.add(child.classname)
+                        stack.append((child, 0))
+                    continue
+                visiting.discard(current.classname)
+                schematic = Schematic(
+                    classname = current.classname, name = current.name, 
+                    slug = current.slug, tier = current.tier, 
+                    type = current.type, 
+                    required = [bound[x] for x in required],
+                    recipes = [recipes_index[x] for x in current.recipes
+                               if x in recipes_index])
+                bound[current.classname] = schematic
+                schematics.append(schematic)
+        return schematics
 
     @staticmethod
     def search_buildings(buildings_str: List[str], 
-                        buildings: List[Building]) -> List[Building]:
+                        buildings: dict) -> List[Building]:
+        """ Resolves building classnames against a classname index. Unknown
+        classnames are skipped.
+        """
         found_buildings = []
-        
-        #[x for x in buildings if x.classname == building_name]  
-        #[x for x in buildings if x.classname in buildings_str] 
-        
         for building_name in buildings_str:
-            for building in buildings:
-                if building.classname == building_name:
-                    found_buildings.append(building)
-                    break
-                
+            building = buildings.get(building_name)
+            if building is not None:
+                found_buildings.append(building)
         return found_buildings
 
     @staticmethod
-    def search_ingredients(ingredients_str: List[str],
-                           items: List[Item]) -> List[ItemAmount]:
+    def search_ingredients(ingredients_str: List[tuple],
+                           items: dict) -> List[ItemAmount]:
+        """ Resolves (classname, amount) pairs against an item classname 
+        index.
+        """
         found_item_amounts = []
-                
-        for ingredient in ingredients_str:
-            for item in items:
-                if item.classname == ingredient['item']:
-                    found_item_amounts.append(
-                        ItemAmount(item, ingredient['amount']))
-        
+        for classname, amount in ingredients_str:
+            item = items.get(classname)
+            if item is not None:
+                found_item_amounts.append(ItemAmount(item, amount))
         return found_item_amounts
 
     @staticmethod
-    def search_products(products_str: List[str],
-                           items: List[Item]) -> List[ItemAmount]:
-        found_item_amounts = []
-                
-        for product in products_str:
-            for item in items:
-                if item.classname == product['item']:
-                    found_item_amounts.append(
-                        ItemAmount(item, product['amount']))
-        
-        return found_item_amounts
+    def search_products(products_str: List[tuple],
+                           items: dict) -> List[ItemAmount]:
+        """ Resolves product entries against an item classname index. """
+        return Binder.search_ingredients(products_str, items)
 
 
 class World:
     
-    def __init__(self, name, recipes=None, items=None, buildings=None):
+    def __init__(self, name, recipes=None, items=None, buildings=None,
+                 schematics=None, resources=None, miners=None, 
+                 generators=None):
         self.name = name
-        self.recipes = recipes
-        self.items = items
-        self.buildings = buildings
+        self.recipes = recipes if recipes is not None else []
+        self.items = items if items is not None else []
+        self.buildings = buildings if buildings is not None else []
+        self.schematics = schematics if schematics is not None else []
+        self.resources = resources if resources is not None else []
+        self.miners = miners if miners is not None else []
+        self.generators = generators if generators is not None else []
+        self.reindex()
+
+    def reindex(self) -> None:
+        """ Rebuilds the lookup indexes. Must be called after items, 
+        buildings or recipes are replaced.
+        """
+        self.items_by_classname = Indexer.by_classname(self.items)
+        self.items_by_slug = Indexer.by_slug(self.items)
+        self.items_by_name = Indexer.by_name(self.items)
+        self.buildings_by_classname = Indexer.by_classname(self.buildings)
+        self.buildings_by_slug = Indexer.by_slug(self.buildings)
+        self.buildings_by_name = Indexer.by_name(self.buildings)
+        self.recipes_by_classname = Indexer.by_classname(self.recipes)
+        self.recipes_by_slug = Indexer.by_slug(self.recipes)
+        self.recipes_by_name = Indexer.by_name(self.recipes)
+        self.recipes_by_product = Indexer.by_product(self.recipes)
+        self.recipes_by_ingredient = Indexer.by_ingredient(self.recipes)
+        self.schematics_by_classname = Indexer.by_classname(self.schematics)
+        self.resources_by_item = {x.item.classname: x 
+                                  for x in reversed(self.resources)}
+        self.miners_by_classname = Indexer.by_classname(self.miners)
+        self.generators_by_classname = Indexer.by_classname(self.generators)
+        self._search_index = None
+        self._progression = None
+
+    def progression(self):
+        """ Unlock closure of the schematics, built on first use (see 
+        progression.Progression).
+        """
+        if self._progression is None:
+            from progression import Progression
+            self._progression = Progression(self)
+        return self._progression
+
+    def search_index(self):
+        """ Full-text index over items, recipes and buildings, built on first
+        use (see search_index.SearchIndex).
+        """
+        if self._search_index is None:
+            from search_index import SearchIndex
+            self._search_index = SearchIndex(self)
+        return self._search_index
+
+    def get_item(self, classname: str) -> Item:
+        return self.items_by_classname.get(classname)
+
+    def get_building(self, classname: str) -> Building:
+        return self.buildings_by_classname.get(classname)
+
+    def get_recipe(self, classname: str) -> Recipe:
+        return self.recipes_by_classname.get(classname)
+
+    def get_schematic(self, classname: str) -> Schematic:
+        return self.schematics_by_classname.get(classname)
+
+    def get_resource(self, item: Item) -> Resource:
+        return self.resources_by_item.get(item.classname)
+
+    def miners_for(self, item: Item) -> List[Miner]:
+        """ Miners that can extract item. """
+        return [x for x in self.miners if item in x.allowed_resources]
+
+    def find_item(self, key: str) -> Item:
+        """ Finds an item by className, slug or case-insensitive name. """
+        return (self.items_by_classname.get(key) 
+                or self.items_by_slug.get(key)
+                or self.items_by_name.get(key.lower()))
+
+    def recipes_producing(self, item: Item) -> List[Recipe]:
+        return self.recipes_by_product.get(item.classname, [])
+
+    def recipes_consuming(self, item: Item) -> List[Recipe]:
+        return self.recipes_by_ingredient.get(item.classname, [])
+
+    def bind_default_recipes(self, policy: RecipePolicy=None) -> None:
+        """ Re-chooses default recipes using the recipe index. """
+        Binder.bind_default_recipes(self.items, self.recipes, policy,
+                                    self.recipes_by_product)
 
 
 class ProductionInstance:
@@ -315,18 +756,86 @@ class ProductionInstance:
 class Startup:
     
     @staticmethod
-    def setup_world(name: str) -> World:
-        obj_inst = ObjectInstantiator()
-        items = obj_inst.instantiate_items(sp.get_items())
-        buildings = obj_inst.instantiate_buildings(sp.get_buildings())
-        draft_recipes = obj_inst.instantiate_draft_recipes(sp.get_recipes())
+    def setup_world(name: str, file_dir: str=None, 
+                    use_snapshot: bool=True) -> World:
+        """ Returns a bound world for the dataset at file_dir, or for the 
+        parser's configured dataset when no path is given. A compiled 
+        snapshot next to the dataset is used when it is newer than it; 
+        otherwise the world is built from JSON and the snapshot refreshed.
+        """
+        if not use_snapshot:
+            return Startup.build_world(name, file_dir)
         
+        import snapshot
+        with instrumentation.timer('setup.snapshot_load'):
+            world = snapshot.load_if_fresh(name, file_dir)
+        if world is not None:
+            return world
+        world = Startup.build_world(name, file_dir)
+        try:
+            with instrumentation.timer('setup.snapshot_save'):
+                snapshot.save(world, file_dir)
+        except OSError:
+            pass
+        return world
+
+    @staticmethod
+    def build_world(name: str, file_dir: str=None) -> World:
+        """ Builds a bound world from the JSON dataset. """
+        with instrumentation.timer('setup.parse'):
+            sp.load_dataset(file_dir)
+        obj_inst = ObjectInstantiator()
+        with instrumentation.timer('setup.instantiate'):
+            items = obj_inst.instantiate_items(sp.get_items(file_dir))
+            buildings = obj_inst.instantiate_buildings(
+                sp.get_buildings(file_dir))
+            draft_recipes = obj_inst.instantiate_draft_recipes(
+                sp.get_recipes(file_dir))
+            draft_schematics = obj_inst.instantiate_draft_schematics(
+                sp.get_schematics(file_dir))
+        return Startup.assemble_world(
+            name, items, buildings, draft_recipes, draft_schematics,
+            sp.get_resources(file_dir), sp.get_miners(file_dir),
+            sp.get_generators(file_dir))
+
+    @staticmethod
+    def assemble_world(name: str, items: List[Item], 
+                       buildings: List[Building], 
+                       draft_recipes: List[DraftRecipe],
+                       draft_schematics: List[DraftSchematic],
+                       resources_dict: dict, miners_dict: dict,
+                       generators_dict: dict) -> World:
+        """ Binds instantiated objects and the raw resources, miners and 
+        generators sections into a World. Takes ownership of draft_recipes
+        and draft_schematics: they are emptied once bound, so the drafts
+        are released even while the caller still holds the lists.
+        """
+        obj_inst = ObjectInstantiator()
         binder = Binder()
-        recipes = binder.bind_recipes(items, buildings, draft_recipes)
-        items = binder.bind_default_recipes(items, recipes)
+        with instrumentation.timer('setup.bind_recipes'):
+            recipes = binder.bind_recipes(items, buildings, draft_recipes)
+        draft_recipes.clear()
+        with instrumentation.timer('setup.bind_schematics'):
+            schematics = binder.bind_schematics(draft_schematics, recipes)
+        draft_schematics.clear()
+        with instrumentation.timer('setup.bind_default_recipes'):
+            items = binder.bind_default_recipes(items, recipes)
+        
+        with instrumentation.timer('setup.instantiate_supply'):
+            items_index = Indexer.by_classname(items)
+            buildings_index = Indexer.by_classname(buildings)
+            resources = obj_inst.instantiate_resources(
+                resources_dict, items_index)
+            miners = obj_inst.instantiate_miners(
+                miners_dict, items_index, buildings_index)
+            generators = obj_inst.instantiate_generators(
+                generators_dict, items_index, buildings_index)
         
-        world = World(name = name, recipes = recipes, items = items, 
-                      buildings = buildings)
+        with instrumentation.timer('setup.index'):
+            world = World(name = name, recipes = recipes, items = items, 
+                          buildings = buildings, schematics = schematics,
+                          resources = resources, miners = miners, 
+                          generators = generators)
         return world
         
 